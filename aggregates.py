@@ -0,0 +1,100 @@
+import threading
+from collections import Counter
+
+from records import STATUSES
+
+
+class CollectionStats:
+    """
+    Running totals over the collection, kept up to date by a game store
+    (see subscribe() on the stores) so the stats page never rescans it.
+
+    on_reset() rebuilds from a full list of games; on_change() applies a
+    single record change where either side may be None for an add or delete.
+    Hours are summed in whole tenths, so adding and removing games never
+    leaves float residue like -0.0 behind.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.total = 0
+        self.by_status = Counter()
+        self.tenths_by_status = Counter()
+        self.games_by_year = Counter()
+        self.tenths_by_year = Counter()
+        self.additions_by_month = Counter()
+
+    def _apply(self, game, sign):
+        status = game.status
+        year = game.release_year
+        month = game.date_added.strftime('%Y-%m') if game.date_added else None
+        tenths = round(game.hours * 10) if game.hours is not None else None
+
+        self.total += sign
+        self.by_status[status] += sign
+        self.games_by_year[year] += sign
+        self.additions_by_month[month] += sign
+        if tenths is not None:
+            self.tenths_by_status[status] += sign * tenths
+            self.tenths_by_year[year] += sign * tenths
+
+        # Drop empty buckets so removed years/months don't linger as zeros
+        for counter, key in ((self.by_status, status), (self.games_by_year, year),
+                             (self.additions_by_month, month)):
+            if counter[key] <= 0:
+                del counter[key]
+        if year not in self.games_by_year:
+            self.tenths_by_year.pop(year, None)
+        if status not in self.by_status:
+            self.tenths_by_status.pop(status, None)
+
+    def on_reset(self, games):
+        with self._lock:
+            self._clear()
+            for game in games:
+                self._apply(game, 1)
+
+    def on_change(self, before, after):
+        with self._lock:
+            if before is not None:
+                self._apply(before, -1)
+            if after is not None:
+                self._apply(after, 1)
+
+    def summary(self):
+        """The figures shown on the stats page"""
+        with self._lock:
+            return {
+                'total_games': self.total,
+                'completed_games': self.by_status['Complete'],
+                'in_progress_games': self.by_status['In Progress'],
+                'not_started_games': self.by_status['Not Started'],
+                'tabled_games': self.by_status['Tabled'],
+                'total_hours_completed': self.tenths_by_status['Complete'] / 10,
+                'total_hours_remaining': self.tenths_by_status['Not Started'] / 10,
+                'total_hours_in_progress': self.tenths_by_status['In Progress'] / 10,
+            }
+
+    def snapshot(self):
+        """Summary plus per-status, per-release-year and per-month breakdowns"""
+        data = self.summary()
+        with self._lock:
+            data['by_status'] = {
+                status: {'games': self.by_status[status],
+                         'hours': self.tenths_by_status[status] / 10}
+                for status in STATUSES + tuple(s for s in self.by_status if s not in STATUSES)
+            }
+            data['by_release_year'] = [
+                {'year': year, 'games': count, 'hours': self.tenths_by_year[year] / 10}
+                for year, count in sorted(self.games_by_year.items(),
+                                          key=lambda item: (item[0] is None, item[0] or 0))
+            ]
+            data['additions_by_month'] = [
+                {'month': month, 'games': count}
+                for month, count in sorted(self.additions_by_month.items(),
+                                           key=lambda item: (item[0] is None, item[0] or ''))
+            ]
+        return data
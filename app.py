@@ -1,28 +1,37 @@
-from flask import Flask, request, render_template, jsonify, session, redirect, url_for
+from flask import Flask, Response, request, render_template, jsonify, session, redirect, url_for, make_response, g
 from functools import wraps
+import cProfile
+import glob
+import hashlib
 import json
 import random
-import subprocess
 import logging
-import requests
 from bs4 import BeautifulSoup
 import time
-from howlongtobeatpy import HowLongToBeat
 import os
-from urllib.parse import urlparse
+import threading
 from datetime import datetime
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from jobs import JobAlreadyRunning, JobManager
+from users import InvalidUser, UserCollections, UserRegistry
+import hltb
+import images
+import collection
+import importer
+import metrics
+import staleness
+from records import STATUSES
+from store import data_path
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')  # Change this in production
 
-# Set up more detailed logging
-logging.basicConfig(level=logging.DEBUG)
+# LOG_LEVEL=DEBUG for detailed logging; the default keeps debug messages
+# (and formatting their payloads) off the hot paths
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper())
 logger = logging.getLogger(__name__)
 
-# Initialize HLTB client within Flask context
-with app.app_context():
-    hltb_client = HowLongToBeat()
-
 # Authentication decorator
 def login_required(f):
     @wraps(f)
@@ -41,18 +50,151 @@ def edit_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Admin-only decorator, for user management and the shared caches
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not session.get('authenticated') or session.get('user', ADMIN_USER) != ADMIN_USER:
+            return jsonify({"error": "Admin access required"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Conditional GET decorator for views that only depend on the collection
+def collection_cached(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        etag = collection_etag()
+        # Unchanged: answer before rendering the template or serializing JSON
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
+def build_id():
+    """
+    Token for the deployed code, templates and assets: BUILD_ID if set,
+    otherwise a hash of their files' sizes and mtimes, which every worker
+    of a deploy agrees on
+    """
+    if os.environ.get('BUILD_ID'):
+        return os.environ['BUILD_ID']
+    digest = hashlib.sha1()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for pattern in ('*.py', 'templates/*', 'static/js/*', 'static/css/*'):
+        for path in sorted(glob.glob(os.path.join(base, pattern))):
+            stat = os.stat(path)
+            digest.update(f'{os.path.relpath(path, base)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return digest.hexdigest()[:12]
+
+BUILD_ID = build_id()
+
+def collection_etag():
+    """
+    Weak ETag from the store's collection version plus everything else the
+    response depends on: the build (so a deploy isn't hidden behind 304s),
+    the user, the URL (filters, sort, cursor), the display-option cookies
+    and whether the session is view-only.
+    """
+    user_collection = current_collection()
+    variant = '|'.join([
+        BUILD_ID,
+        user_collection.name,
+        request.full_path,
+        request.cookies.get('hideCompleted', ''),
+        request.cookies.get('hideTabled', ''),
+        str(session.get('view_only', False)),
+    ])
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    return f'{user_collection.store.version()}-{digest}'
+
+# Instrumentation
+
+REQUEST_SECONDS = metrics.Histogram(
+    'http_request_seconds', 'Time spent handling requests', ('route', 'method', 'status'))
+
+# With PROFILE_DIR set, an authenticated request with ?profile=1 is run
+# under cProfile and the stats are dumped there (one request at a time)
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+profile_lock = threading.Lock()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if PROFILE_DIR and request.args.get('profile') == '1' and session.get('authenticated'):
+        if profile_lock.acquire(blocking=False):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+        else:
+            logger.warning("Another request is being profiled, not profiling this one")
+
+def finish_profile():
+    """Stop the request's profiler, if any, and dump its stats. Returns the file name."""
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return None
+    try:
+        profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.endpoint or 'unmatched'}-{os.getpid()}.prof"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+        logger.info(f"Profiled {request.method} {request.full_path} into {filename}")
+        return filename
+    finally:
+        profile_lock.release()
+
+@app.after_request
+def record_request_metrics(response):
+    profile = finish_profile()
+    if profile:
+        response.headers['X-Profile'] = profile
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=response.status_code)
+    return response
+
+@app.teardown_request
+def release_profiler(exc):
+    # after_request is skipped when an exception propagates
+    finish_profile()
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus text format. Set METRICS_TOKEN to require it as a bearer token."""
+    token = os.environ.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({"error": "Authentication required"}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        if request.form.get('password') == os.environ.get('ADMIN_PASSWORD', 'your-password-here'):
+        # A blank username is the admin, as before there were other users
+        username = request.form.get('username', '').strip().lower() or ADMIN_USER
+        if users.check(username, request.form.get('password', '')):
+            session.clear()
             session['authenticated'] = True
+            session['user'] = username
             return redirect(url_for('index'))
-        return render_template('login.html', error='Invalid password')
+        return render_template('login.html', error='Invalid username or password')
     return render_template('login.html')
 
 @app.route('/view_only', methods=['POST'])
 def view_only():
+    username = request.form.get('username', '').strip().lower() or ADMIN_USER
+    # Private and unknown users get the same answer, so names don't leak
+    if not users.is_public(username):
+        return render_template('login.html', error='That collection is not available')
+    session.clear()
     session['view_only'] = True
+    session['user'] = username
     return redirect(url_for('index'))
 
 @app.route('/logout')
@@ -60,106 +202,123 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
-def load_games():
-    with open('games_data.json', 'r') as f:
-        games = json.load(f)
-        # Format display times while keeping original data
-        for game in games:
-            if game['HowLongToBeat'] != "Unreleased":
-                try:
-                    # Store original time in a new field if needed
-                    game['HowLongToBeatRaw'] = game['HowLongToBeat']
-                    # Round for display
-                    game['HowLongToBeat'] = str(round(float(game['HowLongToBeat'])))
-                except (ValueError, TypeError):
-                    # Keep original value if conversion fails
-                    pass
-        return games
-
-def save_games(games):
-    with open('games_data.json', 'w') as f:
-        json.dump(games, f, indent=2)
-
-def download_and_cache_image(image_url, game_id):
-    """Download and cache an image locally with optimization"""
-    if not image_url:
-        return ''
-    
-    logging.info(f"Attempting to cache image for game {game_id} from {image_url}")
-    
-    # Create cache directory if it doesn't exist
-    cache_dir = os.path.join('static', 'game_images')
-    os.makedirs(cache_dir, exist_ok=True)
-    
-    # Always use .jpg for output to ensure consistent format and compression
-    local_filename = f'game_{game_id}.jpg'
-    local_path = os.path.join(cache_dir, local_filename)
-    relative_path = f'/static/game_images/{local_filename}'
-    
-    # If file doesn't exist, download and optimize it
-    if not os.path.exists(local_path):
-        try:
-            # Download image to a temporary file
-            temp_path = os.path.join(cache_dir, f'temp_{game_id}')
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-            response = requests.get(image_url, headers=headers)
-            if response.status_code == 200:
-                with open(temp_path, 'wb') as f:
-                    f.write(response.content)
-                
-                # Process the image using ImageMagick
-                subprocess.run([
-                    'convert', temp_path,
-                    '-resize', '400x600>',  # Doubled dimensions for higher quality
-                    '-quality', '95',       # Increased quality
-                    '-strip',               # Remove metadata
-                    '-interlace', 'Plane',  # Progressive loading
-                    local_path
-                ], check=True)
-                
-                logging.info(f"Successfully cached and optimized image for game {game_id}")
-            else:
-                logging.error(f"Failed to download image for game {game_id}: HTTP {response.status_code}")
-                return ''
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error optimizing image: {e}")
-            # If optimization fails, just copy the original
-            os.rename(temp_path, local_path)
-        except Exception as e:
-            logging.error(f"Error caching image for game {game_id}: {str(e)}")
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return ''
-        
-        # Clean up temp file if it exists
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        
-        return relative_path
-    return relative_path
+# Accounts. The admin (ADMIN_USER, password ADMIN_PASSWORD) owns the
+# collection at the single-user paths and can add other users
+ADMIN_USER = os.environ.get('ADMIN_USER', 'admin')
+users = UserRegistry(os.environ.get('USERS_DB') or data_path('users.db'), ADMIN_USER,
+                     os.environ.get('ADMIN_PASSWORD', 'your-password-here'))
+
+# Each user's collection (store, stats, name index, change feed and jobs),
+# opened on first use. STORAGE_BACKEND applies to all of them
+user_collections = UserCollections(os.environ.get('USERS_DIR') or data_path('users'), ADMIN_USER)
+
+@app.before_request
+def check_session_user():
+    # Sessions end with the account, and view-only ones when the collection
+    # is made private. Posters, scripts and the admin's own session don't
+    # need the check
+    if request.endpoint == 'static' or session.get('user', ADMIN_USER) == ADMIN_USER:
+        return
+    if session.get('view_only'):
+        allowed = users.is_public(session['user'])
+    else:
+        allowed = users.exists(session['user'])
+    if not allowed:
+        session.clear()
 
-def search_and_cache_game_image(game_name, game_id):
+def current_collection():
+    """The collection of the logged-in (or viewed) user; the admin's for anonymous requests"""
+    return user_collections.get(session.get('user', ADMIN_USER))
+
+@app.route('/admin/users')
+@admin_required
+def list_users():
+    return jsonify({'users': users.names(), 'admin': ADMIN_USER})
+
+@app.route('/admin/users', methods=['POST'])
+@admin_required
+def add_user():
+    """
+    Create an account from {"username": ..., "password": ...}, with an empty
+    collection. Add "public": true to let anyone view it without logging in.
+    """
+    data = request.get_json(silent=True) or {}
+    username = str(data.get('username', '')).strip().lower()
+    try:
+        users.add(username, data.get('password'), bool(data.get('public')))
+    except InvalidUser as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'message': f'Added user {username}'}), 201
+
+@app.route('/admin/users/<username>', methods=['DELETE'])
+@admin_required
+def remove_user(username):
+    """
+    Delete an account. Its files are moved aside rather than deleted, and its
+    posters no longer count as used.
+    """
+    try:
+        users.remove(username)
+    except InvalidUser as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    user_collections.remove(username)
+    images.manifest.set_refs(username, [])
+    return jsonify({'success': True, 'message': f'Removed user {username}'})
+
+@app.route('/account/sharing', methods=['POST'])
+@edit_required
+def account_sharing():
+    """Make the logged-in user's collection public ({"public": true}) or private again"""
+    data = request.get_json(silent=True) or {}
+    try:
+        users.set_public(current_collection().name, bool(data.get('public')))
+    except InvalidUser as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    state = 'public' if data.get('public') else 'private'
+    return jsonify({'success': True, 'message': f'Your collection is now {state}'})
+
+# Each open /events stream holds a server thread, so cap them per process
+EVENT_STREAM_SECONDS = int(os.environ.get('EVENTS_STREAM_SECONDS', 300))
+event_streams = threading.BoundedSemaphore(int(os.environ.get('EVENTS_MAX_STREAMS', 4)))
+
+# Record fields describing a poster, whose files are shared between users
+IMAGE_FIELDS = ('ImageURL', 'ImageVariants', 'ImageSource')
+
+def share_image_fields(user_collection, changes):
+    """
+    Apply {game_id: fields} to a user's collection (None for none), then
+    give every other user with the same games the new poster fields, since
+    the files their records point at are shared and may have been replaced.
+    Returns the number of the user's games updated.
+    """
+    updated = user_collection.store.update_many(changes) if user_collection is not None else 0
+    image_changes = {}
+    for game_id, fields in changes.items():
+        image_fields = {key: value for key, value in fields.items() if key in IMAGE_FIELDS}
+        if image_fields:
+            image_changes[str(game_id)] = image_fields
+    for user, game_ids in images.manifest.users_for(image_changes).items():
+        if user_collection is not None and user == user_collection.name:
+            continue
+        if not users.exists(user):
+            continue
+        user_collections.get(user).store.update_many({game_id: image_changes[game_id] for game_id in game_ids})
+    return updated
+
+def search_and_cache_game_image(game_name, game_id, executor=None):
     """
     Search for a game's image using HLTB API and cache it locally.
-    Returns the cached image path if successful, empty string otherwise.
+    Returns the image fields for the game record if successful, {} otherwise.
     """
     try:
         # Search for the game using HLTB
         logging.info(f"Searching HLTB for {game_name} (ID: {game_id})")
         
-        # Create a new HLTB instance if needed
-        try:
-            results = hltb_client.search(game_name)
-        except Exception as e:
-            logging.error(f"Error with existing HLTB client, creating new one: {str(e)}")
-            new_client = HowLongToBeat()
-            results = new_client.search(game_name)
+        results = hltb.search(game_name)
         
         if not results:
             logging.info(f"No results found for {game_name}")
-            return ''
+            return {}
             
         # Find the specific game version
         game_info = next((game for game in results if game.game_id == game_id), results[0])
@@ -171,7 +330,7 @@ def search_and_cache_game_image(game_name, game_id):
         
         if not image_url:
             logging.info(f"No image URL found for {game_name}")
-            return ''
+            return {}
             
         # Add https prefix if needed
         if not image_url.startswith('http'):
@@ -179,69 +338,140 @@ def search_and_cache_game_image(game_name, game_id):
             logging.info(f"Updated image URL: {image_url}")
             
         # Download and cache the image
-        return download_and_cache_image(image_url, game_id)
+        return images.download_and_cache_image(image_url, game_id, executor)
         
     except Exception as e:
         logging.error(f"Error searching for game image {game_name}: {str(e)}")
         import traceback
         logging.error(f"Traceback: {traceback.format_exc()}")
-        return ''
+        return {}
+
+# Jobs that fetch posters one at a time save the records this often, so a
+# cancelled or crashed job keeps what it already fetched
+IMAGE_SAVE_EVERY = 25
 
-def update_missing_game_images():
-    """Update images for all games that don't have an image file on disk"""
+def update_missing_game_images(job, user_collection):
+    """Update images for all games whose poster file is missing from the image cache"""
+    # A diff against the image manifest rather than a stat per game
+    games = images.missing_posters(user_collection.store.all())
+    job.set_total(len(games))
+    changes = {}
+    updated_count = 0
+    
     try:
-        games = load_games()
-        updated_count = 0
-        
         for game in games:
-            image_url = game.get('ImageURL', '')
-            if image_url.startswith('/static/'):
-                # Check if the image file exists
-                image_path = image_url.lstrip('/')
-                if not os.path.exists(image_path):
-                    logging.info(f"Searching for image for {game['GameName']}")
-                    cached_url = search_and_cache_game_image(game['GameName'], game['GameID'])
-                    if cached_url:
-                        game['ImageURL'] = cached_url
-                        updated_count += 1
-                        logging.info(f"Successfully updated image for {game['GameName']}")
-                    else:
-                        logging.error(f"Failed to find image for {game['GameName']}")
-        
-        if updated_count > 0:
-            save_games(games)
-            logging.info(f"Added images for {updated_count} games")
-        
-        return updated_count
-        
-    except Exception as e:
-        logging.error(f"Error updating missing game images: {str(e)}")
-        return 0
+            job.check_cancelled()
+            logging.info(f"Searching for image for {game.name}")
+            image_fields = search_and_cache_game_image(game.name, game.game_id, images.process_pool())
+            if image_fields:
+                changes[game.game_id] = image_fields
+                logging.info(f"Successfully updated image for {game.name}")
+            else:
+                logging.error(f"Failed to find image for {game.name}")
+                job.fail(game.name, 'No image found')
+                continue
+            job.advance()
+            if len(changes) >= IMAGE_SAVE_EVERY:
+                updated_count += share_image_fields(user_collection, changes)
+                changes = {}
+    finally:
+        # Keep the images fetched so far, even if the job was cancelled
+        updated_count += share_image_fields(user_collection, changes)
+    
+    if updated_count > 0:
+        logging.info(f"Added images for {updated_count} games")
+    
+    return {'message': f"Added images for {updated_count} games", 'updated': updated_count}
 
 @app.route('/')
 @login_required
+@collection_cached
 def index():
     sort_column = request.args.get('sort_column', 'GameName')
-    sort_order = request.args.get('sort_order', 'ASC')
+    sort_order = request.args.get('sort_order', 'ASC').upper()
 
-    games = load_games()
+    user_collection = current_collection()
+    # Read before the collection so the page never misses a later event
+    events_since = user_collection.events.latest()
+    # Read before the games, so a listing cached under it is never older
+    version = (user_collection.name, user_collection.store.version())
+    games = user_collection.store.all()
 
-    def custom_sort(game):
-        if game['ProgressStatus'] == 'In Progress':
-            return (0, game['GameName'].lower())
-        return (1, game['GameName'].lower())
+    # Check if this is an AJAX request
+    if request.args.get('ajax'):
+        def custom_sort(game):
+            if game.status == 'In Progress':
+                return (0, game.name.lower())
+            return (1, game.name.lower())
 
-    games.sort(key=custom_sort)
+        games.sort(key=custom_sort)
 
-    if sort_order == 'DESC':
-        games.reverse()
+        if sort_order == 'DESC':
+            games.reverse()
 
-    # Check if this is an AJAX request
-    if request.args.get('ajax'):
-        return jsonify(games)
+        return jsonify([game.to_json() for game in games])
+
+    # Only the first page is rendered; the grid fetches the rest from /api/games
+    try:
+        page = collection.query_games(games, **collection_filters(), sort_column=sort_column,
+                                      sort_order=sort_order, version=version)
+    except collection.InvalidQuery:
+        page = collection.query_games(games, **collection_filters(), version=version)
+    page = page_json(page)
 
     is_view_only = session.get('view_only', False)
-    return render_template('index.html', games=games, sort_column=sort_column, sort_order=sort_order, is_view_only=is_view_only)
+    return render_template('index.html', games=page['games'], page=page, sort_column=sort_column, sort_order=sort_order, is_view_only=is_view_only, events_since=events_since, username=user_collection.name)
+
+def collection_filters():
+    """
+    Collection filters from the query string. The hide flags default to the
+    display-option cookies so the server-rendered first page matches the UI.
+    """
+    def flag(name, cookie):
+        value = request.args.get(name, request.cookies.get(cookie, 'false'))
+        return value.lower() in ('1', 'true', 'yes')
+
+    return {
+        'status': request.args.get('status'),
+        'hide_complete': flag('hide_complete', 'hideCompleted'),
+        'hide_tabled': flag('hide_tabled', 'hideTabled'),
+        'text': request.args.get('q'),
+    }
+
+def page_json(page):
+    """A query_games() page with its games in their JSON shape"""
+    return dict(page, games=[game.to_json() for game in page['games']])
+
+@app.route('/api/games')
+@login_required
+@collection_cached
+def api_games():
+    """Cursor-paginated, filtered and sorted slice of the collection"""
+    user_collection = current_collection()
+    version = (user_collection.name, user_collection.store.version())
+    try:
+        page = collection.query_games(
+            user_collection.store.all(),
+            **collection_filters(),
+            sort_column=request.args.get('sort_column', 'GameName'),
+            sort_order=request.args.get('sort_order', 'ASC').upper(),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', collection.DEFAULT_PAGE_SIZE, type=int),
+            version=version
+        )
+    except collection.InvalidQuery as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify(page_json(page))
+
+@app.route('/collection/search')
+@login_required
+@collection_cached
+def collection_search():
+    """Games in the collection ranked by how well their names match q"""
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    results = current_collection().name_index.search(query, limit)
+    return jsonify([dict(game.to_json(), score=score) for game, score in results])
 
 @app.route('/add_game', methods=['POST'])
 @edit_required
@@ -259,82 +489,66 @@ def add_game():
             
         submitted_id = int(data['GameID'])
         
-        # Search using the library
-        results = hltb_client.search(search_term)
+        game_store = current_collection().store
+
+        # Reuse the result the search popup already fetched where possible
+        try:
+            game_info = hltb.lookup_game(submitted_id, search_term)
+        except hltb.HLTBUnavailable as e:
+            return jsonify({'success': False, 'message': f'HowLongToBeat is unavailable: {e}'}), 503
         
-        if results:
-            # Find the specific game version that was selected
-            game_info = next((game for game in results if game.game_id == submitted_id), None)
-            
-            if game_info:
-                game_id = game_info.game_id
-                game_name = game_info.game_name
-                
-                # Fix image URL handling
-                image_url = game_info.game_image_url
-                if image_url and not image_url.startswith('http'):
-                    image_url = f"https://howlongtobeat.com{image_url}"
-                
-                # Get completion time
-                how_long_to_beat = None
-                if hasattr(game_info, 'main_story') and game_info.main_story:
-                    how_long_to_beat = round(float(game_info.main_story))
-                
-                # Get release year
-                release_year = None
-                if hasattr(game_info, 'release_world') and game_info.release_world:
-                    release_year = int(game_info.release_world)
-
-                games = load_games()
-
-                # Check for duplicate
-                existing_game = next(
-                    (game for game in games 
-                     if game['GameName'] == game_name 
-                     and game['ReleaseYear'] == release_year), 
-                    None
-                )
-
-                if existing_game:
-                    return jsonify({
-                        'success': False,
-                        'message': 'This game is already in your collection'
-                    }), 409
-                
-                # Cache the image locally
-                cached_image_url = download_and_cache_image(image_url, game_id) if image_url else ''
-                logger.info("Original image URL: %s", image_url)
-                logger.info("Cached image URL: %s", cached_image_url)
-                
-                new_game = {
-                    "GameID": game_id,
-                    "GameName": game_name,
-                    "HowLongToBeat": how_long_to_beat or "Unreleased",
-                    "ProgressStatus": "Not Started",
-                    "ImageURL": cached_image_url or '',
-                    "ReleaseYear": release_year,
-                    "DateAdded": datetime.now().isoformat()
-                }
-                
-                logger.info("Saving game with data: %s", new_game)
-                
-                games.append(new_game)
-                save_games(games)
-                return jsonify({
-                    'success': True,
-                    'message': 'Game added successfully',
-                    'game': new_game
-                }), 200
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': 'Selected game version not found'
-                }), 404
-        else:
+        if not game_info:
             return jsonify({
                 'success': False,
-                'message': 'Game not found'
+                'message': 'Selected game version not found'
             }), 404
+
+        game_id = game_info.game_id
+        game_name = game_info.game_name
+        image_url = hltb.image_url(game_info)
+        
+        # Get release year
+        release_year = None
+        if hasattr(game_info, 'release_world') and game_info.release_world:
+            release_year = int(game_info.release_world)
+
+        # Check for duplicate
+        existing_game = game_store.find(game_name, release_year)
+
+        if existing_game:
+            return jsonify({
+                'success': False,
+                'message': 'This game is already in your collection'
+            }), 409
+
+        # Warn about likely duplicates under a different name unless confirmed
+        if not data.get('force'):
+            similar_games = current_collection().name_index.similar(game_name, release_year)
+            if similar_games:
+                names = ', '.join(game.name for game in similar_games)
+                return jsonify({
+                    'success': False,
+                    'message': f'Similar games already in your collection: {names}',
+                    'near_duplicates': [game.to_json() for game in similar_games]
+                }), 409
+        
+        # Cache the image locally, unless another user already has the game
+        image_fields = images.cached_poster(game_id) if image_url else None
+        if image_fields is None:
+            image_fields = images.download_and_cache_image(image_url, game_id) if image_url else {}
+        logger.info("Original image URL: %s", image_url)
+        logger.info("Cached image URL: %s", image_fields.get('ImageURL'))
+        
+        new_game = importer.game_from_hltb(game_info, image_fields)
+        
+        logger.debug("Saving game with data: %s", new_game)
+        
+        game_store.add(new_game)
+        return jsonify({
+            'success': True,
+            'message': 'Game added successfully',
+            'game': new_game.to_json()
+        }), 200
     except Exception as e:
         logger.error("Unexpected error in add_game: %s", str(e))
         return jsonify({
@@ -342,75 +556,134 @@ def add_game():
             'message': f'Error adding game: {str(e)}'
         }), 500
 
-@app.route('/update_games', methods=['POST'])
+@app.route('/import', methods=['POST'])
 @edit_required
-def update_games():
+def import_games():
+    """
+    Bulk-add games from a CSV or JSON list of titles and/or HLTB ids.
+    Streams one NDJSON line per row as it is resolved, then a summary once
+    the new games have been added in a single write.
+    """
     try:
-        games = load_games()
-        updated_count = 0
-        cached_count = 0
-        
-        for game in games:
-            # Check if we need to cache the image
-            if game['ImageURL'] and game['ImageURL'].startswith('http'):
-                logging.info(f"Caching image for {game['GameName']}")
-                cached_url = download_and_cache_image(game['ImageURL'], game['GameID'])
-                if cached_url and not cached_url.startswith('http'):
-                    game['ImageURL'] = cached_url
-                    cached_count += 1
+        rows = importer.parse_rows(request.get_data(as_text=True), request.mimetype)
+    except importer.InvalidImport as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # The response streams after the request context is gone
+    game_store = current_collection().store
+
+    def generate():
+        for result in importer.run_import(rows, game_store):
+            yield json.dumps(result) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+def refresh_game(game, executor=None):
+    """
+    Look up a single game on HLTB and cache its image if needed.
+    Returns (changed fields, whether an image was cached).
+    """
+    changes = {}
+    image_cached = False
+
+    # Check if we need to cache the image
+    if game.image_url and game.image_url.startswith('http'):
+        logging.info(f"Caching image for {game.name}")
+        image_fields = images.download_and_cache_image(game.image_url, game.game_id, executor)
+        if image_fields:
+            changes.update(image_fields)
+            image_cached = True
+
+    # Check for game updates from HLTB, matching on the stored HLTB id
+    # rather than whichever search result comes first
+    game_info = hltb.lookup_game(game.game_id, game.name, refresh=True)
+    if game_info is not None:
+        # Update HLTB time if different
+        hours = getattr(game_info, 'main_story', None)
+        if hours and float(hours) != game.hours:
+            changes['HowLongToBeat'] = float(hours)
+
+        # Update release year if missing, or if an unreleased game's date moved
+        release_year = getattr(game_info, 'release_world', None)
+        if release_year and (not game.release_year or
+                             (not game.released and release_year != game.release_year)):
+            changes['ReleaseYear'] = release_year
+    else:
+        logging.warning(f"{game.name} (id {game.game_id}) not found on HLTB")
+
+    changes['LastChecked'] = datetime.now().isoformat(timespec='seconds')
+    return changes, image_cached
+
+def refresh_games(job, user_collection, games):
+    """Refresh the given games from HLTB and cache remote images"""
+    job.set_total(len(games))
+    changes = {}
+    updated_count = 0
+    cached_count = 0
+    
+    # Lookups run on a bounded pool; hltb.rate_limiter keeps the overall
+    # request rate polite regardless of the pool size
+    executor = ThreadPoolExecutor(max_workers=hltb.CONCURRENCY)
+    try:
+        futures = {executor.submit(refresh_game, game, images.process_pool()): game for game in games}
+        for future in as_completed(futures):
+            game = futures[future]
+            try:
+                game_changes, image_cached = future.result()
+            except Exception as e:
+                logging.error(f"Error updating {game.name}: {e}")
+                job.fail(game.name, e)
+                continue
             
-            # Check for game updates from HLTB
-            results = hltb_client.search(game['GameName'])
-            if results and len(results) > 0:
-                game_info = results[0]  # Get the first match
-                needs_update = False
-                
-                # Update HLTB time if different
-                if hasattr(game_info, 'main_story') and str(game_info.main_story) != str(game['HowLongToBeat']):
-                    game['HowLongToBeat'] = str(game_info.main_story)
-                    needs_update = True
-                
-                # Update release year if missing
-                if ('ReleaseYear' not in game or not game['ReleaseYear']) and hasattr(game_info, 'release_world'):
-                    game['ReleaseYear'] = game_info.release_world
-                    needs_update = True
-                
-                if needs_update:
-                    updated_count += 1
-        
-        save_games(games)
-        
-        message = []
-        if updated_count > 0:
-            message.append(f"Updated {updated_count} game{'s' if updated_count != 1 else ''}")
-        if cached_count > 0:
-            message.append(f"Cached {cached_count} image{'s' if cached_count != 1 else ''}")
-        
-        if not message:
-            message = ["No updates needed"]
+            if image_cached:
+                cached_count += 1
+            if set(game_changes) - {'ImageURL', 'ImageVariants', 'ImageSource', 'LastChecked'}:
+                updated_count += 1
+            if game_changes:
+                changes[game.game_id] = game_changes
+            job.advance()
             
-        return jsonify({"success": True, "message": ". ".join(message)})
-        
-    except Exception as e:
-        logging.error(f"Error updating games: {e}")
-        return jsonify({"success": False, "message": "Error updating games"}), 500
+            if job.cancel_requested:
+                # Keep what finished so far, drop lookups that haven't started
+                for pending in futures:
+                    pending.cancel()
+                break
+    finally:
+        executor.shutdown(wait=True)
+    
+    share_image_fields(user_collection, changes)
+    
+    message = []
+    if updated_count > 0:
+        message.append(f"Updated {updated_count} game{'s' if updated_count != 1 else ''}")
+    if cached_count > 0:
+        message.append(f"Cached {cached_count} image{'s' if cached_count != 1 else ''}")
+    if job.failed > 0:
+        message.append(f"{job.failed} failed")
+    
+    if not message:
+        message = ["No updates needed"]
+    
+    return {'message': ". ".join(message), 'updated': updated_count, 'cached': cached_count}
+
+def run_update_games(job, user_collection):
+    """Refresh every game from HLTB and cache remote images"""
+    return refresh_games(job, user_collection, user_collection.store.all())
+
+def run_refresh_stale(job, user_collection):
+    """Refresh the games whose HLTB data is most overdue (see staleness.py)"""
+    games = staleness.due_games(user_collection.store.all(), limit=staleness.REFRESH_BATCH)
+    return refresh_games(job, user_collection, games)
+
+@app.route('/update_games', methods=['POST'])
+@edit_required
+def update_games():
+    return start_job('update_games', run_update_games)
 
 @app.route('/delete_game/<game_id>', methods=['DELETE'])
 @edit_required
 def delete_game(game_id):
-    games = load_games()
-    initial_count = len(games)
-    
-    # Convert game_id to int if it's a numeric string
-    try:
-        game_id = int(game_id)
-    except ValueError:
-        pass  # Keep it as a string if it's not a valid integer
-
-    games = [game for game in games if str(game['GameID']) != str(game_id)]
-    
-    if len(games) < initial_count:
-        save_games(games)
+    if current_collection().store.delete(game_id):
         return jsonify({"message": "Game deleted successfully", "success": True}), 200
     else:
         return jsonify({"message": "Game not found", "success": False}), 404
@@ -425,18 +698,9 @@ def update_status(game_id):
         if not new_status:
             return jsonify({"success": False, "message": "Status is required"}), 400
 
-        games = load_games()
-        game_found = False
-        for game in games:
-            if game['GameID'] == game_id:
-                game['ProgressStatus'] = new_status
-                game_found = True
-                break
-                
-        if not game_found:
+        if not current_collection().store.update(game_id, ProgressStatus=new_status):
             return jsonify({"success": False, "message": "Game not found"}), 404
-            
-        save_games(games)
+
         return jsonify({"success": True, "message": "Status updated successfully"})
 
     except Exception as e:
@@ -444,23 +708,130 @@ def update_status(game_id):
         return jsonify({"success": False, "message": "Error updating status"}), 500
 
 
+# Cap on operations per /games/batch request
+MAX_BATCH_OPERATIONS = 1000
+
+def parse_batch_operation(item):
+    """Turn one /games/batch item into a store operation, or raise ValueError"""
+    op = item.get('op')
+    if op not in ('set_status', 'delete', 'restore'):
+        raise ValueError(f'Unknown op: {op}')
+    game_id = item.get('GameID')
+    if op == 'restore' and game_id is None and isinstance(item.get('game'), dict):
+        # Earlier pages sent back the whole deleted record; only its id is used
+        game_id = item['game'].get('GameID')
+    try:
+        game_id = int(game_id)
+    except (ValueError, TypeError):
+        raise ValueError('GameID must be an integer')
+    if op == 'set_status':
+        if item.get('status') not in STATUSES:
+            raise ValueError(f"Unknown status: {item.get('status')}")
+        return ('update', game_id, {'ProgressStatus': item['status']})
+    return (op, game_id)
+
+@app.route('/games/batch', methods=['POST'])
+@edit_required
+def batch_games():
+    """
+    Apply status changes, deletes and restores to many games with a single
+    write. Takes {"operations": [{"op": "set_status", "GameID": 1, "status":
+    "Complete"}, {"op": "delete", "GameID": 2}, {"op": "restore", "GameID":
+    2}]} and returns a result per operation. Restores bring back a game
+    deleted within the last day from the server's copy of its record.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('operations')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'operations must be a non-empty list'}), 400
+    if len(items) > MAX_BATCH_OPERATIONS:
+        return jsonify({'success': False, 'message': f'At most {MAX_BATCH_OPERATIONS} operations per request'}), 400
+
+    user_collection = current_collection()
+    game_store = user_collection.store
+    results = []
+    operations = []
+    for index, item in enumerate(items):
+        result = {'index': index, 'op': item.get('op') if isinstance(item, dict) else None}
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('Each operation must be an object')
+            operation = parse_batch_operation(item)
+            result['GameID'] = operation[1]
+            if operation[0] == 'restore':
+                deleted = user_collection.deleted.get(operation[1])
+                if deleted is None:
+                    raise ValueError('No recently deleted game with that GameID')
+                operation = ('add', deleted)
+        except ValueError as e:
+            result.update(success=False, message=str(e))
+        else:
+            if operation[0] == 'delete':
+                deleted = game_store.get(operation[1])
+                if deleted is not None:
+                    result['game'] = deleted.to_json()
+            operations.append((result, operation))
+        results.append(result)
+
+    try:
+        applied = game_store.apply_batch([operation for _, operation in operations])
+    except Exception as e:
+        logger.error(f"Error applying batch: {str(e)}")
+        return jsonify({'success': False, 'message': 'Error applying batch'}), 500
+
+    for (result, operation), ok in zip(operations, applied):
+        result['success'] = ok
+        if not ok:
+            result.pop('game', None)
+            result['message'] = 'Game already exists' if operation[0] == 'add' else 'Game not found'
+
+    succeeded = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': succeeded == len(results),
+        'message': f'Applied {succeeded} of {len(results)} operations',
+        'results': results
+    })
+
 @app.route('/random_game')
 def random_game():
-    games = load_games()
-    not_started_games = [game['GameName'] for game in games if game['ProgressStatus'] == 'Not Started']
+    # Respect the same filters as the grid (search text, hidden statuses)
+    filters = dict(collection_filters(), status=None)
+    not_started_games = collection.filter_games(current_collection().store.by_status('Not Started'), **filters)
 
     if not_started_games:
-        game_name = random.choice(not_started_games)
+        game = random.choice(not_started_games).to_json()
+        game_name = game['GameName']
     else:
+        game = None
         game_name = "No 'Not Started' games available"
 
-    return jsonify({"gameName": game_name}), 200
+    return jsonify({"gameName": game_name, "game": game}), 200
 
 @app.route('/in_progress_game')
+@collection_cached
 def in_progress_game():
-    games = load_games()
-    in_progress = next((game for game in games if game['ProgressStatus'] == 'In Progress'), None)
-    return jsonify({"game": in_progress})
+    in_progress = next(iter(current_collection().store.by_status('In Progress')), None)
+    return jsonify({"game": in_progress.to_json() if in_progress else None})
+
+def search_result_json(game):
+    """A search result as the add dialog expects it"""
+    # Fix image URL construction
+    image_url = game.game_image_url if hasattr(game, 'game_image_url') else None
+    if image_url and not image_url.startswith('http'):
+        image_url = f"https://howlongtobeat.com{image_url}"
+
+    # Get main story time in hours
+    main_story_hours = game.main_story if hasattr(game, 'main_story') else None
+    if main_story_hours:
+        main_story_hours = round(float(main_story_hours))
+
+    return {
+        'game_id': game.game_id,
+        'game_name': game.game_name,
+        'game_image_url': image_url,
+        'release_world': game.release_world if hasattr(game, 'release_world') else None,
+        'main_story': main_story_hours
+    }
 
 @app.route('/search_games', methods=['POST'])
 def search_games():
@@ -468,39 +839,25 @@ def search_games():
         data = request.json
         search_term = data['GameName']
         
-        logger.debug(f"Searching for term: {search_term}")
+        logger.debug("Searching for term: %s", search_term)
         
-        # Use the HowLongToBeat library to search
-        results = hltb_client.search(search_term)
+        # Use the HowLongToBeat library to search (through the result cache)
+        results = hltb.search(search_term)
         
         if results:
-            games_data = []
-            for game in results:
-                # Fix image URL construction
-                image_url = game.game_image_url if hasattr(game, 'game_image_url') else None
-                if image_url and not image_url.startswith('http'):
-                    image_url = f"https://howlongtobeat.com{image_url}"
-                
-                # Get main story time in hours
-                main_story_hours = game.main_story if hasattr(game, 'main_story') else None
-                if main_story_hours:
-                    main_story_hours = round(float(main_story_hours))
-                
-                game_data = {
-                    'game_id': game.game_id,
-                    'game_name': game.game_name,
-                    'game_image_url': image_url,
-                    'release_world': game.release_world if hasattr(game, 'release_world') else None,
-                    'main_story': main_story_hours
-                }
-                games_data.append(game_data)
-            
-            logger.debug(f"Found {len(games_data)} games")
+            games_data = [search_result_json(game) for game in results]
+            logger.debug("Found %d games", len(games_data))
             return jsonify(games_data)
         
         logger.debug("No results found")
         return jsonify([])
         
+    except hltb.HLTBUnavailable as e:
+        logger.warning(f"HLTB unavailable for search: {e}")
+        return jsonify({
+            'error': 'HowLongToBeat is unavailable, try again shortly',
+            'details': str(e)
+        }), 503
     except Exception as e:
         logger.error(f"Error searching games: {str(e)}")
         logger.exception("Full traceback:")
@@ -509,6 +866,36 @@ def search_games():
             'details': str(e)
         }), 500
 
+@app.route('/search_games/suggest')
+@edit_required
+def suggest_games():
+    """
+    Type-ahead suggestions for the add dialog, as the user types ?q=. Served
+    from earlier searches for longer or shorter versions of the query where
+    possible; identical searches in flight share one upstream call.
+    """
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 8, type=int), 20))
+    try:
+        results, source = hltb.suggest(query, limit)
+    except hltb.HLTBUnavailable as e:
+        return jsonify({'success': False, 'message': f'HowLongToBeat is unavailable: {e}'}), 503
+    response = jsonify({
+        'query': query,
+        'source': source,
+        'results': [search_result_json(game) for game in results]
+    })
+    # Let the browser reuse suggestions when the user retypes a query
+    response.headers['Cache-Control'] = 'private, max-age=300'
+    return response
+
+@app.route('/hltb/cache_stats')
+@login_required
+def hltb_cache_stats():
+    """Hit/miss counters for the HLTB search result cache, coalesced lookups and the upstream circuit state"""
+    return jsonify(dict(hltb.search_cache.stats(), circuit=hltb.breaker.state,
+                        coalesced=hltb.flights.coalesced))
+
 def get_hltb_user_id():
     # Placeholder implementation
     # Replace with actual logic to retrieve the user ID if needed
@@ -516,111 +903,337 @@ def get_hltb_user_id():
 
 @app.route('/stats')
 @login_required
+@collection_cached
 def stats():
-    games = load_games()
-    
-    # Calculate statistics
-    stats = {
-        'total_games': len(games),
-        'completed_games': len([g for g in games if g['ProgressStatus'] == 'Complete']),
-        'in_progress_games': len([g for g in games if g['ProgressStatus'] == 'In Progress']),
-        'not_started_games': len([g for g in games if g['ProgressStatus'] == 'Not Started']),
-        'tabled_games': len([g for g in games if g['ProgressStatus'] == 'Tabled']),
-        'total_hours_completed': sum(float(g['HowLongToBeat']) for g in games 
-                                   if g['ProgressStatus'] == 'Complete' 
-                                   and g['HowLongToBeat'] != 'Unreleased'),
-        'total_hours_remaining': sum(float(g['HowLongToBeat']) for g in games 
-                                   if g['ProgressStatus'] == 'Not Started' 
-                                   and g['HowLongToBeat'] != 'Unreleased'),
-        'total_hours_in_progress': sum(float(g['HowLongToBeat']) for g in games 
-                                     if g['ProgressStatus'] == 'In Progress' 
-                                     and g['HowLongToBeat'] != 'Unreleased')
-    }
-    
-    return render_template('stats.html', stats=stats)
+    return render_template('stats.html', stats=current_collection().stats.summary())
+
+@app.route('/stats.json')
+@login_required
+@collection_cached
+def stats_json():
+    """Stats with breakdowns by status, release year and month added"""
+    return jsonify(current_collection().stats.snapshot())
 
 @app.route('/recent_games')
 @login_required
+@collection_cached
 def recent_games():
-    games = load_games()
-    # Sort games by DateAdded (falling back to GameID for older entries that might not have DateAdded)
-    recent = sorted(games, key=lambda x: x.get('DateAdded', ''), reverse=True)[:5]
-    return jsonify(recent)
+    # Sort games by DateAdded (entries without DateAdded sort last)
+    recent = current_collection().store.recent(5)
+    return jsonify([game.to_json() for game in recent])
+
+def poster_source_url(game):
+    """
+    Upstream URL of a game's poster. Records cached before ImageSource was
+    stored only have the local path, so those are looked up on HLTB.
+    """
+    source = game.image_source
+    if source and source.get('url'):
+        return source['url']
+    if game.image_url.startswith('http'):
+        return game.image_url
+    game_info = hltb.lookup_game(game.game_id, game.name)
+    if game_info and game_info.game_image_url:
+        image_url = game_info.game_image_url
+        if not image_url.startswith('http'):
+            image_url = f"https://howlongtobeat.com{image_url}"
+        return image_url
+    return None
+
+def refetch_image(game, executor):
+    """
+    Re-download a game's poster with a conditional GET and rebuild its
+    variants on `executor`. Returns the new image fields, or None if the
+    upstream image is unchanged.
+    """
+    image_url = poster_source_url(game)
+    if not image_url:
+        raise ValueError("No poster source URL")
+    return images.fetch_and_store(image_url, game.game_id, executor, source=game.image_source)
+
+def run_refetch_images(job, user_collection):
+    """Refetch and reprocess all game images"""
+    # Get all games from the database
+    games = [game for game in user_collection.store.all() if game.image_url]
+    job.set_total(len(games))
+    processed = 0
+    unchanged = 0
+    changes = {}
+    
+    # Downloads overlap on threads while resizing fans out over all cores
+    pool = images.process_pool()
+    executor = ThreadPoolExecutor(max_workers=hltb.CONCURRENCY)
+    try:
+        futures = {executor.submit(refetch_image, game, pool): game for game in games}
+        for future in as_completed(futures):
+            game = futures[future]
+            try:
+                image_fields = future.result()
+                if image_fields is None:
+                    unchanged += 1
+                else:
+                    changes[game.game_id] = image_fields
+                    processed += 1
+                job.advance()
+            except Exception as e:
+                logging.error(f"Error processing game {game.game_id}: {str(e)}")
+                job.fail(game.game_id, e)
+            
+            if job.cancel_requested:
+                for pending in futures:
+                    pending.cancel()
+                break
+    finally:
+        executor.shutdown(wait=True)
+    
+    share_image_fields(user_collection, changes)
+    # Old variants go only once every record points at the new ones
+    for game in games:
+        if game.game_id in changes:
+            images.discard_replaced(game.image_variants, changes[game.game_id])
+    
+    return {
+        'message': f'Processed {processed} images, {unchanged} unchanged, {job.failed} failed',
+        'processed': processed,
+        'unchanged': unchanged,
+        'failed': job.failed,
+        'total': job.total
+    }
 
 @app.route('/admin/refetch_images', methods=['POST'])
 @edit_required
 def refetch_images():
-    """Refetch and reprocess all game images from IGDB"""
+    return start_job('refetch_images', run_refetch_images)
+
+@app.route('/admin/update_missing_images', methods=['POST'])
+@edit_required
+def update_missing_images():
+    return start_job('update_missing_images', update_missing_game_images)
+
+def run_image_maintenance(job):
+    """
+    Check the image cache against its manifest, remove files of games no
+    user has, retry unoptimized posters and evict files beyond
+    IMAGE_CACHE_MAX_BYTES
+    """
+    job.set_total(4)
+    counts = images.manifest.reconcile()
+    job.advance()
+    job.check_cancelled()
+
+    # Users who haven't been active since the cache became shared have no
+    # references yet; opening their collection records them
+    for user in users.names():
+        if not images.manifest.has_refs(user):
+            user_collections.get(user)
+    removed = len(images.collect_garbage())
+    job.advance()
+    job.check_cancelled()
+
+    reoptimized = images.reoptimize_posters(images.process_pool())
+    job.advance()
+    job.check_cancelled()
+
+    changes, evicted = images.enforce_quota()
+    share_image_fields(None, changes)
+    job.advance()
+
+    return {
+        'message': (f"Removed {removed} unused files, evicted {evicted}, re-optimized {reoptimized}, "
+                    f"{counts['corrupt']} corrupt"),
+        'removed': removed,
+        'evicted': evicted,
+        'reoptimized': reoptimized,
+        'trimmed': len(changes),
+        'reconciled': counts,
+        'cache_bytes': images.manifest.total_size(),
+    }
+
+@app.route('/admin/image_maintenance', methods=['POST'])
+@admin_required
+def image_maintenance():
+    return start_job('image_maintenance', run_image_maintenance, admin=True)
+
+@app.after_request
+def note_poster_use(response):
+    """Served posters count as used for the image cache's LRU eviction"""
+    if response.status_code in (200, 304):
+        path = images.manifest_path(request.path)
+        if path:
+            images.manifest.touch(path)
+    return response
+
+@app.after_request
+def cache_hashed_posters(response):
+    """Content-hashed poster variants never change, so let browsers keep them forever"""
+    if response.status_code == 200 and images.is_immutable(request.path):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+# Background jobs
+
+def start_job(kind, fn, admin=False):
+    """
+    Start a background job for the current user and reply with its id
+    (202), or 409 if one is already running. `fn` gets the job and the
+    user's collection; admin jobs work on the shared caches, get only the
+    job and run on the admin's registry.
+    """
     try:
-        # Get all games from the database
-        games = load_games()
-        total = len(games)
-        processed = 0
-        failed = 0
-        
-        for game in games:
+        if admin:
+            job = user_collections.get(ADMIN_USER).jobs.start(kind, fn)
+        else:
+            user_collection = current_collection()
+            job = user_collection.jobs.start(kind, fn, user_collection)
+    except JobAlreadyRunning as e:
+        return jsonify({'success': False, 'message': str(e), 'job_id': e.job.id}), 409
+    return jsonify({
+        'success': True,
+        'message': f'Started {kind}',
+        'job_id': job.id,
+        'status_url': url_for('job_status', job_id=job.id)
+    }), 202
+
+@app.route('/events')
+@login_required
+def events():
+    """
+    Server-Sent Events feed of collection changes. Each event is a JSON list
+    of records: added, status, updated (with the game's JSON) and deleted
+    (GameID only), or a single reset when the client should re-query.
+    """
+    since = request.headers.get('Last-Event-ID', request.args.get('since', ''))
+    try:
+        since = int(since)
+    except ValueError:
+        since = None
+
+    event_log = current_collection().events
+    if since is None:
+        since = event_log.latest()
+
+    if not event_streams.acquire(blocking=False):
+        response = jsonify({'success': False, 'message': 'Too many open event streams'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    response = Response(event_log.stream(since, EVENT_STREAM_SECONDS), mimetype='text/event-stream')
+    response.call_on_close(event_streams.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies such as nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/jobs')
+@login_required
+def list_jobs():
+    return jsonify([job.to_dict() for job in current_collection().jobs.recent()])
+
+@app.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    job = current_collection().jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+@edit_required
+def cancel_job(job_id):
+    job = current_collection().jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if not job.running:
+        return jsonify({'success': False, 'message': f'Job already {job.status}'}), 409
+    job.cancel()
+    return jsonify({'success': True, 'message': 'Cancellation requested'})
+
+def refreshed_recently(job_manager):
+    """Whether a refresh_stale job was started this cycle, by any worker"""
+    last_started = job_manager.last_started('refresh_stale')
+    return bool(last_started and time.time() - last_started < staleness.REFRESH_INTERVAL / 2)
+
+def start_stale_refresh(user_collection):
+    """Start a refresh_stale job for a collection if any games are due; returns it or None"""
+    if refreshed_recently(user_collection.jobs):
+        return None
+    if not staleness.due_games(user_collection.store.all(), limit=1):
+        logger.debug("Skipping scheduled HLTB refresh for %s, no games are due", user_collection.name)
+        return None
+    try:
+        return user_collection.jobs.start('refresh_stale', run_refresh_stale, user_collection)
+    except JobAlreadyRunning:
+        return None
+
+def refresh_stale_games():
+    """
+    One scheduler cycle: start a refresh_stale job for each user's
+    collection, unless HLTB is failing, nothing is due, or another worker
+    already ran one this cycle.
+
+    Collections this process doesn't have open are opened just for their
+    refresh, one at a time, and dropped afterwards, so workers don't end up
+    holding every user's store.
+    """
+    if hltb.breaker.state == 'open':
+        logger.info("Skipping scheduled HLTB refresh, HLTB is unavailable")
+        return []
+    started = []
+    for user in users.names():
+        user_collection = user_collections.loaded(user)
+        if user_collection is not None:
+            job = start_stale_refresh(user_collection)
+        else:
+            # Check the job registry before loading the store
+            if refreshed_recently(JobManager(path=user_collections.paths(user)[2])):
+                continue
+            job = start_stale_refresh(user_collections.open_once(user))
+            if job is not None:
+                job.wait()
+        if job is not None:
+            started.append(job)
+    return started
+
+# Image cache maintenance runs this often, in seconds (0 disables it)
+IMAGE_MAINTENANCE_INTERVAL = int(os.environ.get('IMAGE_MAINTENANCE_INTERVAL', 6 * 3600))
+
+def image_maintenance_cycle():
+    """Start an image_maintenance job unless another worker just ran one"""
+    job_manager = user_collections.get(ADMIN_USER).jobs
+    last_started = job_manager.last_started('image_maintenance')
+    if last_started and time.time() - last_started < IMAGE_MAINTENANCE_INTERVAL / 2:
+        return None
+    try:
+        return job_manager.start('image_maintenance', run_image_maintenance)
+    except JobAlreadyRunning:
+        return None
+
+def schedule(name, interval, fn):
+    """Call fn() every `interval` seconds on a daemon thread"""
+    def loop():
+        while True:
+            # Jittered so workers don't all wake up together
+            time.sleep(interval * random.uniform(0.9, 1.1))
             try:
-                if not game['ImageURL']:
-                    continue
-                    
-                # Construct IGDB image URL
-                image_url = game['ImageURL']
-                
-                # Get the relative and local paths
-                relative_path = os.path.join('game_images', f'game_{game["GameID"]}.jpg')
-                local_path = os.path.join('static', relative_path)
-                
-                # Create game_images directory if it doesn't exist
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                
-                # Download and process the image
-                response = requests.get(image_url, stream=True)
-                if response.status_code == 200:
-                    # Save to temp file first
-                    temp_path = local_path + '.temp'
-                    with open(temp_path, 'wb') as f:
-                        f.write(response.content)
-                    
-                    # Process with ImageMagick
-                    subprocess.run([
-                        'convert', temp_path,
-                        '-resize', '400x600>',
-                        '-quality', '95',
-                        '-strip',
-                        '-interlace', 'Plane',
-                        local_path
-                    ], check=True)
-                    
-                    # Clean up temp file
-                    os.remove(temp_path)
-                    processed += 1
-                    
-                else:
-                    logging.error(f"Failed to download image for game {game['GameID']}: HTTP {response.status_code}")
-                    failed += 1
-                    
+                fn()
             except Exception as e:
-                logging.error(f"Error processing game {game['GameID']}: {str(e)}")
-                failed += 1
-                continue
-                
-            # Log progress every 10 games
-            if processed % 10 == 0:
-                logging.info(f"Processed {processed}/{total} images")
-        
-        return jsonify({
-            'status': 'success',
-            'message': f'Processed {processed} images, {failed} failed',
-            'processed': processed,
-            'failed': failed,
-            'total': total
-        })
-        
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+                logger.error(f"Error in scheduled {name}: {e}")
+
+    if interval > 0:
+        threading.Thread(target=loop, name=name, daemon=True).start()
+
+def start_schedulers():
+    """
+    Start the periodic jobs in this process. Called by the server process
+    (gunicorn's post_worker_init hook, or below), never on import, so image
+    pool processes that re-import this module don't schedule jobs too.
+    """
+    schedule('hltb-refresh', staleness.REFRESH_INTERVAL, refresh_stale_games)
+    schedule('image-maintenance', IMAGE_MAINTENANCE_INTERVAL, image_maintenance_cycle)
 
 if __name__ == '__main__':
+    # With the debug reloader, only the child process serving requests
+    # schedules jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_schedulers()
     app.run(host='0.0.0.0', debug=True, port=5015)
@@ -1,21 +1,49 @@
-import csv
+import json
+import os
+import sys
 import requests
 
-# URL of the Flask add_game endpoint
-url = 'http://localhost:5000/add_game'
+# Bulk-import a backlog through the /import endpoint.
+#
+#   ADMIN_PASSWORD=... python batch.py games.csv [http://localhost:5015]
+#
+# The file is a CSV with a header row (GameName/GameID/ProgressStatus
+# columns, or just titles in the first column) or a .json list of titles,
+# HLTB ids or {GameName, GameID, ProgressStatus} objects.
 
-# Path to the CSV file
-csv_file_path = '/root/next2play/games.csv'
+def import_file(path, base_url):
+    content_type = 'application/json' if path.endswith('.json') else 'text/csv'
+    with open(path, 'rb') as f:
+        body = f.read()
 
-# Read the CSV file and send POST requests to the add_game endpoint
-with open(csv_file_path, mode='r') as file:
-    csv_reader = csv.reader(file)
-    next(csv_reader)  # Skip the header row
-    for row in csv_reader:
-        game_title = row[0]
-        data = {'GameName': game_title}
-        response = requests.post(url, data=data)
-        if response.status_code == 204:
-            print(f"Successfully added {game_title}")
+    session = requests.Session()
+    login = session.post(f'{base_url}/login', data={'password': os.environ.get('ADMIN_PASSWORD', '')},
+                         allow_redirects=False)
+    if login.status_code != 302 or not session.cookies:
+        print("Login failed, check ADMIN_PASSWORD")
+        sys.exit(1)
+
+    response = session.post(f'{base_url}/import', data=body, headers={'Content-Type': content_type},
+                            stream=True)
+    if response.status_code != 200:
+        print(f"Import failed: {response.text}")
+        sys.exit(1)
+
+    for line in response.iter_lines():
+        if not line:
+            continue
+        result = json.loads(line)
+        if result.get('done'):
+            print(f"Added {result['added']} of {result['total']} games in {result['elapsed_seconds']}s "
+                  f"({result['duplicates']} duplicates, {result['not_found']} not found, {result['failed']} failed)")
+        elif result['status'] == 'ready':
+            print(f"Row {result['row']}: {result['input']} -> {result['GameName']}")
         else:
-            print(f"Failed to add {game_title}: {response.text}")
+            print(f"Row {result['row']}: {result['input']} {result['status']} "
+                  f"{result.get('message') or result.get('GameName') or ''}".rstrip())
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python batch.py <games.csv|games.json> [base_url]")
+        sys.exit(1)
+    import_file(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else 'http://localhost:5015')
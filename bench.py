@@ -0,0 +1,405 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+# Benchmark the app against synthetic collections, offline.
+#
+#   python bench.py [--sizes 1000,10000,100000] [--backend json|sqlite] [--output bench.json]
+#
+# Each collection size runs in a fresh process with its own data directory.
+# HowLongToBeat is replaced by a stub and posters are served from a local
+# HTTP server, so update_games and refetch_images can be timed too. Results
+# (latency percentiles and throughput per route, job durations) are written
+# as JSON; a summary table goes to stderr.
+
+ROUTES = (
+    ('GET', '/'),
+    ('GET', '/?ajax=1'),
+    ('GET', '/api/games?limit=50'),
+    ('GET', '/stats'),
+    ('GET', '/stats.json'),
+    ('GET', '/recent_games'),
+    ('GET', '/collection/search'),
+    ('POST', '/update_status'),
+    ('POST', '/add_game'),
+    ('DELETE', '/delete_game'),
+)
+
+WORDS = ('Shadow', 'Legend', 'Dragon', 'Star', 'Dark', 'Lost', 'Final', 'Iron', 'Crystal', 'Souls',
+         'Quest', 'Kingdom', 'Hollow', 'Knight', 'Chrono', 'Night', 'Wild', 'Eternal', 'Fallen', 'Empire',
+         'Hunter', 'Tales', 'Galaxy', 'Ruins', 'Echoes', 'Storm', 'Hearts', 'Frontier', 'Abyss', 'Saga')
+
+STATUS_WEIGHTS = {'Not Started': 60, 'In Progress': 5, 'Complete': 30, 'Tabled': 5}
+
+POSTER_ETAG = '"bench-poster"'
+
+
+def game_name(i):
+    rng = random.Random(i)
+    words = rng.sample(WORDS, rng.randint(2, 4))
+    return f"{' '.join(words)} {i}"
+
+
+def search_query(n):
+    """The n-th /collection/search query: two title words, a typo or a partly typed word"""
+    rng = random.Random(n)
+    first, second = rng.sample(WORDS, 2)
+    if n % 3 == 1:
+        dropped = rng.randrange(1, len(first))
+        return first[:dropped] + first[dropped + 1:]
+    if n % 3 == 2:
+        return f'{first} {second[:3]}'
+    return f'{first} {second}'
+
+
+def generate_games(count, poster_url, seed=0):
+    """Synthetic collection records in the on-disk JSON shape"""
+    rng = random.Random(seed)
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    started = datetime(2020, 1, 1)
+    games = []
+    for i in range(1, count + 1):
+        hours = 'Unreleased' if rng.random() < 0.05 else round(rng.uniform(1, 120), 1)
+        games.append({
+            'GameID': i,
+            'GameName': game_name(i),
+            'HowLongToBeat': hours,
+            'ProgressStatus': rng.choices(statuses, weights)[0],
+            'ImageURL': f'/static/game_images/game_{i}.jpg',
+            'ImageVariants': {
+                fmt: [{'width': width, 'url': f'/static/game_images/game_{i}_{width}w_0123456789.{ext}'}
+                      for width in (200, 400)]
+                for fmt, ext in (('avif', 'avif'), ('webp', 'webp'), ('jpeg', 'jpg'))
+            },
+            'ImageSource': {'url': f'{poster_url}/poster/{i}.png'},
+            'ReleaseYear': rng.randint(1990, 2026),
+            'DateAdded': (started + timedelta(minutes=i)).isoformat(),
+        })
+    return games
+
+
+def poster_bytes():
+    from PIL import Image
+    image = Image.linear_gradient('L').resize((600, 900)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def start_poster_server():
+    """Serve the same poster for every path, honouring If-None-Match. Returns its base URL."""
+    body = poster_bytes()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get('If-None-Match') == POSTER_ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', POSTER_ETAG)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+
+class StubHLTB:
+    """Stands in for HowLongToBeat: answers every search with a made-up exact match"""
+
+    def __init__(self, poster_url, latency=0):
+        self.poster_url = poster_url
+        self.latency = latency
+
+    @staticmethod
+    def game_id_for(name):
+        return 10_000_000 + zlib.crc32(name.encode()) % 10_000_000
+
+    def _entry(self, game_id, name):
+        rng = random.Random(game_id)
+        return SimpleNamespace(
+            game_id=game_id, game_name=name, game_alias='', game_type='game',
+            game_image_url=f'{self.poster_url}/hltb/{game_id}.png', game_web_link='',
+            release_world=rng.randint(1990, 2026), main_story=round(rng.uniform(1, 120), 1),
+            main_extra=None, completionist=None, similarity=1.0, profile_platforms=[],
+        )
+
+    def search(self, query):
+        time.sleep(self.latency)
+        return [self._entry(self.game_id_for(query), query)]
+
+    def search_from_id(self, game_id):
+        time.sleep(self.latency)
+        return self._entry(game_id, f'Bench Game {game_id}')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, statuses):
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': ms(sum(latencies) / len(latencies)) if latencies else None,
+            'p50': ms(percentile(latencies, 0.50)),
+            'p90': ms(percentile(latencies, 0.90)),
+            'p99': ms(percentile(latencies, 0.99)),
+            'max': ms(latencies[-1] if latencies else None),
+        },
+    }
+
+
+def time_route(app, make_request, requests, max_seconds, concurrency):
+    """
+    Issue up to `requests` requests from `concurrency` threads, stopping
+    early once `max_seconds` have passed. make_request(client, n) performs
+    the n-th request and returns the response.
+    """
+    latencies = []
+    statuses = {}
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    deadline = time.perf_counter() + max_seconds
+
+    def worker():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['authenticated'] = True
+        while True:
+            with lock:
+                n = next(counter, None)
+            # Always take a few samples, however slow the route
+            if n is None or (n >= 3 and time.perf_counter() > deadline):
+                return
+            started = time.perf_counter()
+            response = make_request(client, n)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(latencies, time.perf_counter() - started, statuses)
+
+
+def run_job(app_module, path):
+    """Start a job through its route and wait for it; returns its duration and outcome"""
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['authenticated'] = True
+    started = time.perf_counter()
+    response = client.post(path)
+    job_manager = app_module.user_collections.get(app_module.ADMIN_USER).jobs
+    job = job_manager.get(response.get_json()['job_id'])
+    while job.running:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    return {
+        'games': job.total,
+        'status': job.status,
+        'failed': job.failed,
+        'seconds': round(elapsed, 3),
+        'games_per_second': round(job.total / elapsed, 2) if job.total else None,
+        'result': job.result,
+    }
+
+
+def child(config):
+    """Benchmark one collection size in this (fresh) process; returns the results dict"""
+    workdir = tempfile.mkdtemp(prefix='next2play-bench-')
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        os.chdir(workdir)
+        os.makedirs(os.path.join('static', 'game_images'))
+        poster_url = start_poster_server()
+        with open('games_data.json', 'w') as f:
+            json.dump(generate_games(config['games'], poster_url), f)
+        os.environ.update({
+            'GAMES_DATA': os.path.join(workdir, 'games_data.json'),
+            'GAMES_DB': os.path.join(workdir, 'games_data.db'),
+            'STORAGE_BACKEND': config['backend'],
+            'JOBS_DB': os.path.join(workdir, 'jobs.db'),
+            'EVENTS_DB': os.path.join(workdir, 'events.db'),
+            'USERS_DB': os.path.join(workdir, 'users.db'),
+            'USERS_DIR': os.path.join(workdir, 'users'),
+            'HLTB_CACHE_PATH': os.path.join(workdir, 'hltb_cache.db'),
+            'HLTB_REFRESH_INTERVAL': '0',
+            'IMAGE_MAINTENANCE_INTERVAL': '0',
+            'IMAGE_MANIFEST': os.path.join(workdir, 'image_manifest.db'),
+        })
+
+        # Configure logging before the app does, or it logs every request at DEBUG
+        logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+        sys.path.insert(0, source_dir)
+        started = time.perf_counter()
+        import app as app_module
+        import hltb
+        load_seconds = time.perf_counter() - started
+
+        stub = StubHLTB(poster_url, latency=config['hltb_latency'])
+        hltb.client = stub
+        hltb.rate_limiter = hltb.TokenBucket(rate=1e9, burst=1e9)
+        app = app_module.app
+        result = {
+            'games': config['games'],
+            'backend': config['backend'],
+            'load_seconds': round(load_seconds, 3),
+            'routes': [],
+            'jobs': [],
+        }
+
+        if config['routes']:
+            rng = random.Random(1)
+            count = config['games']
+            statuses = list(STATUS_WEIGHTS)
+            # Each delete removes a different game; start past the ids update_status touches
+            deletable = list(range(count // 2 + 1, count + 1))
+            rng.shuffle(deletable)
+
+            def add_game(client, n):
+                name = f'Bench Addition {n} {rng.randint(0, 1 << 30)}'
+                return client.post('/add_game', json={'GameName': name, 'GameID': stub.game_id_for(name)})
+
+            requests = {
+                '/update_status': lambda client, n: client.post(
+                    f'/update_status/{rng.randint(1, max(1, count // 2))}', json={'status': rng.choice(statuses)}),
+                '/add_game': add_game,
+                '/collection/search': lambda client, n: client.get(
+                    '/collection/search', query_string={'q': search_query(n)}),
+                '/delete_game': lambda client, n: client.delete(
+                    f'/delete_game/{deletable[n % len(deletable)] if deletable else 0}'),
+            }
+            for method, path in ROUTES:
+                make_request = requests.get(path, lambda client, n, path=path: client.get(path))
+                timing = time_route(app, make_request, config['requests'], config['max_seconds'],
+                                    config['concurrency'])
+                result['routes'].append(dict(route=path, method=method, **timing))
+
+        if config['jobs']:
+            for name, path in (('update_games', '/update_games'),
+                               ('refetch_images (cold)', '/admin/refetch_images'),
+                               ('refetch_images (conditional)', '/admin/refetch_images')):
+                result['jobs'].append(dict(job=name, **run_job(app_module, path)))
+
+        result['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        return result
+    finally:
+        os.chdir(source_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_child(config):
+    process = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', json.dumps(config)],
+                             stdout=subprocess.PIPE, check=True)
+    return json.loads(process.stdout)
+
+
+def print_summary(report):
+    out = sys.stderr
+    for run in report['runs']:
+        print(f"\n{run['games']} games ({run['backend']}), loaded in {run['load_seconds']}s, "
+              f"max RSS {run['max_rss_mb']} MB", file=out)
+        for route in run['routes']:
+            latency = route['latency_ms']
+            print(f"  {route['method']:6} {route['route']:22} {route['requests']:5} req  "
+                  f"p50 {latency['p50']:9.2f} ms  p90 {latency['p90']:9.2f} ms  p99 {latency['p99']:9.2f} ms  "
+                  f"{route['throughput_rps']:9.1f} req/s  {route['errors']} errors", file=out)
+        for job in run['jobs']:
+            print(f"  job    {job['job']:28} {job['games']} games in {job['seconds']}s "
+                  f"({job['games_per_second']} games/s, {job['status']})", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark next2play routes and jobs against synthetic collections')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated collection sizes (default: %(default)s)')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route (default: %(default)s)')
+    parser.add_argument('--max-seconds', type=float, default=10,
+                        help='stop timing a route after this long (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=1, help='client threads per route (default: %(default)s)')
+    parser.add_argument('--job-games', type=int, default=200,
+                        help='collection size for the update_games/refetch_images runs, 0 to skip (default: %(default)s)')
+    parser.add_argument('--hltb-latency', type=float, default=0,
+                        help='seconds the HLTB stub sleeps per lookup (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # stdout carries the results back to the parent; keep stray output off it
+        results, sys.stdout = sys.stdout, sys.stderr
+        json.dump(child(json.loads(args.child)), results)
+        return
+
+    base = {
+        'backend': args.backend,
+        'requests': args.requests,
+        'max_seconds': args.max_seconds,
+        'concurrency': args.concurrency,
+        'hltb_latency': args.hltb_latency,
+    }
+    runs = []
+    for size in [int(size) for size in args.sizes.split(',') if size.strip()]:
+        print(f"Benchmarking routes with {size} games...", file=sys.stderr)
+        runs.append(run_child(dict(base, games=size, routes=True, jobs=False)))
+    if args.job_games:
+        print(f"Benchmarking jobs with {args.job_games} games...", file=sys.stderr)
+        runs.append(run_child(dict(base, games=args.job_games, routes=False, jobs=True)))
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': base,
+        'runs': runs,
+    }
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import base64
+import binascii
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+SORT_COLUMNS = ('GameName', 'GameID', 'HowLongToBeat', 'ReleaseYear', 'DateAdded')
+
+# Sorted listings kept for paging through, see query_games()
+SORTED_CACHE_SIZE = 8
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+# Every key ends with the GameID so keys are unique and make stable cursors.
+# Keys must be JSON-serializable since cursors are built from them.
+SORT_KEYS = {
+    # Default index order: In Progress games first, then alphabetical
+    'GameName': lambda g: (0 if g.status == 'In Progress' else 1, g.name.lower(), str(g.game_id)),
+    # Numerically, with any legacy non-integer ids last
+    'GameID': lambda g: (not isinstance(g.game_id, int), g.game_id if isinstance(g.game_id, int) else 0,
+                         str(g.game_id)),
+    # Unreleased/unknown games sort last
+    'HowLongToBeat': lambda g: (g.hours is None, g.hours or 0.0, str(g.game_id)),
+    'ReleaseYear': lambda g: (g.release_year is None, g.release_year or 0, str(g.game_id)),
+    'DateAdded': lambda g: (g.added_key, str(g.game_id)),
+}
+
+
+def encode_cursor(sort_column, sort_order, key):
+    data = [sort_column, sort_order, list(key)]
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort column, sort order, sort key) a cursor was issued for"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_column, sort_order, key = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(sort_column, str) or not isinstance(sort_order, str) or not isinstance(key, list):
+            raise TypeError
+        return sort_column, sort_order, tuple(key)
+    except (ValueError, TypeError, binascii.Error):
+        raise InvalidQuery('Invalid cursor')
+
+
+def filter_games(games, status=None, hide_complete=False, hide_tabled=False, text=None):
+    """Same filters the index page offers: status, hide complete/tabled and a name search"""
+    text = (text or '').strip().lower()
+    return [
+        game for game in games
+        if not (hide_complete and game.status == 'Complete')
+        and not (hide_tabled and game.status == 'Tabled')
+        and (not status or status == 'All' or game.status == status)
+        and (not text or text in game.name.lower())
+    ]
+
+
+_sorted = OrderedDict()
+_sorted_lock = threading.Lock()
+
+
+def sorted_games(games, sort_column, filters, version=None):
+    """
+    (games, sort keys) of the filtered collection in ascending order. With
+    a version (anything that changes with the collection) the result is
+    kept, so paging through a listing doesn't sort it again for every page.
+    """
+    cache_key = (version, sort_column, tuple(sorted(filters.items()))) if version is not None else None
+    if cache_key is not None:
+        with _sorted_lock:
+            if cache_key in _sorted:
+                _sorted.move_to_end(cache_key)
+                return _sorted[cache_key]
+
+    key = SORT_KEYS[sort_column]
+    rows = sorted(filter_games(games, **filters), key=key)
+    result = (rows, [key(game) for game in rows])
+
+    if cache_key is not None:
+        with _sorted_lock:
+            _sorted[cache_key] = result
+            while len(_sorted) > SORTED_CACHE_SIZE:
+                _sorted.popitem(last=False)
+    return result
+
+
+def query_games(games, status=None, hide_complete=False, hide_tabled=False, text=None,
+                sort_column='GameName', sort_order='ASC', cursor=None, limit=DEFAULT_PAGE_SIZE,
+                version=None):
+    """
+    Filter, sort and paginate a collection. Returns a dict with the page of
+    games, the cursor for the next page (None on the last page) and the
+    number of matching games. `version` lets sorted listings be reused, see
+    sorted_games().
+
+    Cursors encode the sort and the sort key of the last game on the page,
+    so pages stay consistent when games are added or removed between
+    requests. A cursor continues the listing it was issued for, whatever
+    sort the request asks for.
+    """
+    after = None
+    if cursor:
+        sort_column, sort_order, after = decode_cursor(cursor)
+    if sort_column not in SORT_KEYS:
+        raise InvalidQuery(f'Unknown sort column: {sort_column}')
+    if sort_order not in ('ASC', 'DESC'):
+        raise InvalidQuery(f'Unknown sort order: {sort_order}')
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    filters = {'status': status, 'hide_complete': hide_complete, 'hide_tabled': hide_tabled, 'text': text}
+    rows, keys = sorted_games(games, sort_column, filters, version)
+    # A cursor from another sort column, or a forged one, can't be compared
+    if after and keys and len(after) != len(keys[0]):
+        raise InvalidQuery('Invalid cursor')
+
+    try:
+        if sort_order == 'ASC':
+            start = bisect_right(keys, after) if after else 0
+            page = rows[start:start + limit]
+            has_more = start + limit < len(rows)
+        else:
+            end = bisect_left(keys, after) if after else len(rows)
+            page = rows[max(0, end - limit):end][::-1]
+            has_more = end - limit > 0
+    except TypeError:
+        raise InvalidQuery('Invalid cursor')
+
+    next_cursor = None
+    if page and has_more:
+        next_cursor = encode_cursor(sort_column, sort_order, SORT_KEYS[sort_column](page[-1]))
+    return {
+        'games': page,
+        'next_cursor': next_cursor,
+        'total': len(rows),
+    }
@@ -0,0 +1,207 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from records import Game
+
+logger = logging.getLogger(__name__)
+
+EVENTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+DELETED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deleted_games (
+    game_id TEXT PRIMARY KEY,
+    deleted_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+# Deleted games can be restored for this long
+DELETED_KEEP_SECONDS = 24 * 3600
+
+# How often streams look for events published by other processes
+POLL_INTERVAL = 0.5
+
+# Idle streams send a comment this often so dead connections are noticed
+KEEPALIVE_INTERVAL = 15
+
+# Writes touching more games than this publish a single reset record, which
+# tells clients to re-query instead of patching card by card
+MAX_CHANGES = 200
+
+
+def change_record(before, after):
+    """A compact description of one changed game"""
+    if after is None:
+        return {'type': 'deleted', 'GameID': before.game_id}
+    if before is None:
+        kind = 'added'
+    elif before.status != after.status:
+        kind = 'status'
+    else:
+        kind = 'updated'
+    return {'type': kind, 'GameID': after.game_id, 'game': after.to_json()}
+
+
+class EventLog:
+    """
+    Collection change events, shared by every process using the same
+    database file. Each event is the list of change records of one write and
+    gets an increasing sequence number, which SSE clients send back as
+    Last-Event-ID when they reconnect. The newest `history` events are kept.
+    Without a path the log is in memory and private to this process.
+
+    Subscribe it to the game store: it publishes the writes made by this
+    process, and streams pick up other processes' events from the database.
+    """
+
+    def __init__(self, history=1000, path=None):
+        self.history = history
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self._last_published = 0
+        self._db = sqlite3.connect(path or ':memory:', timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.executescript(EVENTS_SCHEMA)
+
+    # Store listener
+
+    def on_reset(self, games):
+        pass
+
+    def on_change(self, before, after):
+        pass
+
+    def on_commit(self, changes):
+        if len(changes) > MAX_CHANGES:
+            records = [{'type': 'reset'}]
+        else:
+            records = [change_record(before, after) for before, after in changes]
+        try:
+            self.publish(records)
+        except sqlite3.Error as e:
+            # The write itself already happened; clients catch up on reconnect
+            logger.error(f"Error publishing change event: {e}")
+
+    def publish(self, records):
+        """Append an event, returning its sequence number"""
+        data = json.dumps(records, separators=(',', ':'))
+        with self._published:
+            seq = self._db.execute('INSERT INTO events (created_at, data) VALUES (?, ?)',
+                                   (time.time(), data)).lastrowid
+            self._db.execute('DELETE FROM events WHERE seq <= ?', (seq - self.history,))
+            self._last_published = seq
+            self._published.notify_all()
+        return seq
+
+    def _latest(self):
+        row = self._db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    def latest(self):
+        """Sequence number of the newest event, 0 if there are none yet"""
+        with self._lock:
+            return self._latest()
+
+    def since(self, seq):
+        """
+        [(seq, JSON data)] of the events after `seq`, oldest first. Returns
+        None if some of them were already pruned (or `seq` is from another
+        log), so the caller can't catch up event by event.
+        """
+        with self._lock:
+            if seq > self._latest():
+                return None
+            rows = self._db.execute('SELECT seq, data FROM events WHERE seq > ? ORDER BY seq',
+                                    (seq,)).fetchall()
+        if rows and rows[0][0] != seq + 1:
+            return None
+        return rows
+
+    def wait(self, seq, timeout):
+        """Block until this process publishes past `seq`, or `timeout` passes"""
+        with self._published:
+            self._published.wait_for(lambda: self._last_published > seq, timeout)
+
+    def stream(self, since, lifetime=300):
+        """
+        Server-Sent Events for everything after `since`. Events published by
+        this process go out straight away, others within POLL_INTERVAL. The
+        stream ends after `lifetime` seconds so it doesn't hold a server
+        thread forever; EventSource reconnects and resumes from its last id.
+        """
+        # Reconnect after a second rather than the browser's default of three
+        yield 'retry: 1000\n\n'
+        deadline = time.monotonic() + lifetime
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            events = self.since(since)
+            if events is None:
+                since = self.latest()
+                events = [(since, json.dumps([{'type': 'reset'}], separators=(',', ':')))]
+            for seq, data in events:
+                yield f'id: {seq}\ndata: {data}\n\n'
+                since = seq
+            if events:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= KEEPALIVE_INTERVAL:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            self.wait(since, POLL_INTERVAL)
+
+
+class DeletedGames:
+    """
+    Records of recently deleted games, so a delete can be undone from the
+    server's copy rather than one sent back by the client. A store listener
+    sharing its database file with other processes, like EventLog; records
+    are dropped once restored or after `keep_seconds`.
+    """
+
+    def __init__(self, path=None, keep_seconds=DELETED_KEEP_SECONDS):
+        self.keep_seconds = keep_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path or ':memory:', timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.executescript(DELETED_SCHEMA)
+
+    # Store listener
+
+    def on_reset(self, games):
+        pass
+
+    def on_change(self, before, after):
+        pass
+
+    def on_commit(self, changes):
+        now = time.time()
+        deleted = [(str(before.game_id), now, json.dumps(before.to_dict()))
+                   for before, after in changes if after is None]
+        restored = [(str(after.game_id),) for before, after in changes if before is None]
+        try:
+            with self._lock:
+                self._db.execute('BEGIN')
+                self._db.executemany('INSERT OR REPLACE INTO deleted_games VALUES (?, ?, ?)', deleted)
+                self._db.executemany('DELETE FROM deleted_games WHERE game_id = ?', restored)
+                self._db.execute('DELETE FROM deleted_games WHERE deleted_at < ?', (now - self.keep_seconds,))
+                self._db.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.error(f"Error recording deleted games: {e}")
+            with self._lock:
+                if self._db.in_transaction:
+                    self._db.execute('ROLLBACK')
+
+    def get(self, game_id):
+        """The record of a game deleted within keep_seconds, or None"""
+        with self._lock:
+            row = self._db.execute('SELECT data FROM deleted_games WHERE game_id = ? AND deleted_at >= ?',
+                                   (str(game_id), time.time() - self.keep_seconds)).fetchone()
+        return Game.from_dict(json.loads(row[0])) if row else None
@@ -1,27 +1,18 @@
-import json
-
-def load_games():
-    with open('games_data.json', 'r') as f:
-        return json.load(f)
-
-def save_games(games):
-    with open('games_data.json', 'w') as f:
-        json.dump(games, f, indent=2)
+import os
+from store import JsonGameStore, data_path
 
 def fix_game_ids():
-    games = load_games()
-    updated_count = 0
+    # Go through the store so its lock is held and any pending journal is
+    # folded in; loading the records already turns GameIDs into integers
+    game_store = JsonGameStore(os.environ.get('GAMES_DATA') or data_path('games_data.json'))
+    games = game_store.all()
 
     for game in games:
-        if not isinstance(game['GameID'], int):
-            try:
-                game['GameID'] = int(game['GameID'])
-                updated_count += 1
-            except ValueError:
-                print(f"Warning: Could not convert GameID to integer for game: {game['GameName']}")
+        if not isinstance(game.game_id, int):
+            print(f"Warning: Could not convert GameID to integer for game: {game.name}")
 
-    save_games(games)
-    print(f"Updated {updated_count} game IDs")
+    game_store.replace_all(games)
+    print(f"Rewrote {game_store.path} with {len(games)} games")
 
 if __name__ == "__main__":
     fix_game_ids()
@@ -0,0 +1,50 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Production server settings, used by the Docker image:
+#
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# Workers share the collection (flock'd JSON files or SQLite) and the job
+# registry, so any of them can serve any request.
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5015')}"
+
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2, 8)))
+
+# Requests mostly wait on HLTB, poster downloads or the disk, so each worker
+# also runs a few threads. gthread also keeps streamed /import responses and
+# /events streams (up to EVENTS_MAX_STREAMS per worker) from tying up a whole
+# worker.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+# Large /import requests stream their progress for minutes
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 300))
+graceful_timeout = 30
+keepalive = 5
+
+# Each worker must open its own store, SQLite connections and process pool
+# after forking, so the app is not preloaded
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+# Workers write their metrics here so /metrics can add them up
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'next2play-metrics'))
+
+
+def on_starting(server):
+    # Counters start from zero with the server, not with each worker
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def post_worker_init(worker):
+    # Scheduled refreshes and image maintenance run in the workers; the
+    # job registry makes sure only one of them runs each cycle
+    from app import start_schedulers
+    start_schedulers()
@@ -0,0 +1,539 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from types import SimpleNamespace
+
+import metrics
+from store import data_path
+
+logger = logging.getLogger(__name__)
+
+# Attributes of a HowLongToBeatEntry worth keeping in the cache
+ENTRY_FIELDS = (
+    'game_id', 'game_name', 'game_alias', 'game_type', 'game_image_url',
+    'game_web_link', 'release_world', 'main_story', 'main_extra',
+    'completionist', 'similarity', 'profile_platforms',
+)
+
+# Stand-in for the HowLongToBeat client (e.g. a stub in bench.py); None
+# uses real clients, created on first use by `pool`
+client = None
+
+# Worker pool size for bulk operations that fan out HLTB lookups
+CONCURRENCY = int(os.environ.get('HLTB_CONCURRENCY', 4))
+
+# The library has no overall timeout (one search is several requests), so
+# callers stop waiting after this many seconds
+TIMEOUT = float(os.environ.get('HLTB_TIMEOUT', 10))
+
+# Failed calls are retried this many times, after a random delay of up to
+# RETRY_BACKOFF seconds, doubling with each attempt
+RETRIES = int(os.environ.get('HLTB_RETRIES', 2))
+RETRY_BACKOFF = 0.5
+
+UPSTREAM_SECONDS = metrics.Histogram(
+    'hltb_request_seconds', 'Time spent in upstream HowLongToBeat calls', ('operation', 'outcome'))
+CACHE_LOOKUPS = metrics.Counter(
+    'hltb_cache_lookups', 'HowLongToBeat search cache lookups', ('result',))
+COALESCED_CALLS = metrics.Counter(
+    'hltb_coalesced_calls', 'HowLongToBeat lookups that joined an identical one in flight', ('operation',))
+
+# Type-ahead suggestions need at least this many characters
+SUGGEST_MIN_LENGTH = 3
+
+
+class HLTBUnavailable(Exception):
+    """HowLongToBeat timed out, kept failing, or is being skipped while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures, refusing calls for
+    `cooldown` seconds. Then a single trial call is let through: success
+    closes the circuit again, failure reopens it.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half_open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("HLTB circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or (self.opened_at is None and self.failures >= self.threshold):
+                logger.warning(f"HLTB circuit open after {self.failures} consecutive failures, "
+                               f"skipping calls for {self.cooldown}s")
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class ClientPool:
+    """
+    Runs HowLongToBeat calls on a few dedicated threads, so callers can stop
+    waiting after a timeout while a stuck call only ties up a pool thread.
+    The library is imported and each thread's client built on first use; a
+    client that raised is replaced on the next call.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._executor = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _client(self):
+        if client is not None:
+            return client
+        if getattr(self._local, 'client', None) is None:
+            from howlongtobeatpy import HowLongToBeat
+            self._local.client = HowLongToBeat()
+        return self._local.client
+
+    def _call(self, method, args):
+        try:
+            return getattr(self._client(), method)(*args)
+        except Exception:
+            self._local.client = None
+            raise
+
+    def call(self, method, *args, timeout=None):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='hltb')
+        future = self._executor.submit(self._call, method, args)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise HLTBUnavailable(f"No answer within {timeout}s")
+
+
+pool = ClientPool(CONCURRENCY)
+
+breaker = CircuitBreaker(
+    threshold=int(os.environ.get('HLTB_BREAKER_THRESHOLD', 5)),
+    cooldown=float(os.environ.get('HLTB_BREAKER_COOLDOWN', 30)),
+)
+
+
+def call_upstream(method, *args):
+    """
+    Call a HowLongToBeat client method with a timeout, retrying failures
+    with jittered backoff. Raises HLTBUnavailable when every attempt failed
+    or the circuit breaker is open.
+    """
+    for attempt in range(RETRIES + 1):
+        if not breaker.allow():
+            raise HLTBUnavailable("HowLongToBeat is unavailable, skipping the request")
+        rate_limiter.acquire()
+        try:
+            with UPSTREAM_SECONDS.time(operation=method):
+                result = pool.call(method, *args, timeout=TIMEOUT)
+            # search() answers None when its requests failed
+            if method == 'search' and result is None:
+                raise HLTBUnavailable("No response")
+        except Exception as e:
+            breaker.record_failure()
+            if attempt == RETRIES:
+                if isinstance(e, HLTBUnavailable):
+                    raise
+                raise HLTBUnavailable(str(e)) from e
+            delay = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+            logger.warning(f"HLTB {method} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs
+    the function, and callers arriving while it runs wait for it and share
+    its result or exception. Per process; workers share finished results
+    through the search cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SimpleNamespace(done=threading.Event(), result=None, error=None)
+            else:
+                self.coalesced += 1
+        if not leader:
+            COALESCED_CALLS.inc(operation=key[0])
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def normalize_query(query):
+    """Cache key for a search term: case-insensitive, whitespace-collapsed"""
+    return ' '.join(query.lower().split())
+
+
+def _entry_to_dict(entry):
+    return {field: getattr(entry, field, None) for field in ENTRY_FIELDS}
+
+
+def _matches(words, result):
+    """Whether every word of a query appears in a result's name or alias"""
+    names = ' '.join(filter(None, (result.get('game_name'), result.get('game_alias')))).lower()
+    return all(word in names for word in words)
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` calls per second with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Shared limit on upstream HLTB searches across all threads
+rate_limiter = TokenBucket(
+    rate=float(os.environ.get('HLTB_RATE', 2)),
+    burst=int(os.environ.get('HLTB_BURST', 5)),
+)
+
+
+class SearchCache:
+    """
+    TTL + LRU cache of HLTB search results, backed by a small SQLite file so
+    results survive restarts.
+
+    The in-memory LRU holds up to `max_entries` queries; the disk store keeps
+    up to `disk_max_entries`, expired ones included so they can stand in
+    while HLTB is down. Results from every cached search are also
+    indexed by game_id, so confirming a pick from the search popup doesn't
+    need another round trip.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=1000, disk_max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (fetched_at, [result dicts])
+        self._by_id = {}               # game_id -> (key, result dict)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS searches ('
+                'query TEXT PRIMARY KEY, fetched_at REAL NOT NULL, results TEXT NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS idx_searches_fetched_at ON searches (fetched_at)')
+
+    def _fresh(self, fetched_at):
+        return time.time() - fetched_at < self.ttl
+
+    def _remember(self, key, fetched_at, results):
+        self._entries[key] = (fetched_at, results)
+        self._entries.move_to_end(key)
+        for result in results:
+            self._by_id[result['game_id']] = (key, result)
+        while len(self._entries) > self.max_entries:
+            evicted_key, (_, evicted) = self._entries.popitem(last=False)
+            self._forget_ids(evicted_key, evicted)
+
+    def _forget_ids(self, key, results):
+        for result in results:
+            if self._by_id.get(result['game_id'], (None,))[0] == key:
+                del self._by_id[result['game_id']]
+
+    def get(self, query, allow_stale=False, max_age=None):
+        """
+        Return cached results for a query, or None on a miss. With
+        allow_stale, expired results still on disk are returned too (e.g.
+        while HLTB is down); they don't count as hits or misses. With
+        max_age, results fetched longer ago than that are a miss, though
+        they stay cached for other callers.
+        """
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                row = self._conn.execute(
+                    'SELECT fetched_at, results FROM searches WHERE query = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, *entry)
+            if entry is not None and self._fresh(entry[0]):
+                if max_age is not None and time.time() - entry[0] >= max_age:
+                    self.misses += 1
+                    return None
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._forget_ids(key, self._entries.pop(key)[1])
+                if allow_stale:
+                    return entry[1]
+            if not allow_stale:
+                self.misses += 1
+            return None
+
+    def put(self, query, results):
+        key = normalize_query(query)
+        fetched_at = time.time()
+        with self._lock:
+            self._remember(key, fetched_at, results)
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO searches VALUES (?, ?, ?)',
+                    (key, fetched_at, json.dumps(results))
+                )
+                self._conn.execute(
+                    'DELETE FROM searches WHERE query IN ('
+                    'SELECT query FROM searches ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)',
+                    (self.disk_max_entries,)
+                )
+
+    def related(self, query):
+        """
+        Answer a query from fresh results in memory without searching: its
+        own results, else those of the longest cached prefix of it, else
+        those of cached searches extending it, keeping only names that
+        contain every word of the query. Returns (results, source), source
+        being 'exact', 'prefix' or 'extension', or None.
+        """
+        key = normalize_query(query)
+        words = key.split()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], 'exact'
+
+            prefixes = []
+            extensions = []
+            for cached_key, (fetched_at, results) in self._entries.items():
+                if cached_key == key or not self._fresh(fetched_at) or cached_key.startswith('id:'):
+                    continue
+                if key.startswith(cached_key):
+                    prefixes.append((len(cached_key), results))
+                elif cached_key.startswith(key):
+                    extensions.append(results)
+
+            found = []
+            source = None
+            if prefixes:
+                found = [result for result in max(prefixes, key=lambda prefix: prefix[0])[1]
+                         if _matches(words, result)]
+                source = 'prefix'
+            if not found:
+                seen = set()
+                for results in extensions:
+                    for result in results:
+                        if result['game_id'] not in seen and _matches(words, result):
+                            seen.add(result['game_id'])
+                            found.append(result)
+                source = 'extension'
+            if not found:
+                return None
+            self.hits += 1
+            return found, source
+
+    def get_game(self, game_id):
+        """Return a cached search result for a game id, or None"""
+        with self._lock:
+            found = self._by_id.get(game_id)
+            if found is None or not self._fresh(self._entries[found[0]][0]):
+                return None
+            self.hits += 1
+            return found[1]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'entries': len(self._entries),
+                'disk_entries': self._conn.execute('SELECT COUNT(*) FROM searches').fetchone()[0],
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+            }
+
+
+# Refreshes accept results fetched this recently, so users with the same
+# game in their collections share one lookup
+REFRESH_MAX_AGE = int(os.environ.get('HLTB_REFRESH_MAX_AGE', 3600))
+
+search_cache = SearchCache(
+    os.environ.get('HLTB_CACHE_PATH') or data_path('hltb_cache.db'),
+    ttl=int(os.environ.get('HLTB_CACHE_TTL', 7 * 24 * 3600)),
+    max_entries=int(os.environ.get('HLTB_CACHE_SIZE', 1000)),
+)
+
+
+def search(query, refresh=False):
+    """
+    Search HLTB through the result cache. Returns objects with the same
+    attributes as HowLongToBeatEntry (see ENTRY_FIELDS). While HLTB is
+    unavailable, expired cached results are served if there are any.
+
+    With refresh=True only results younger than REFRESH_MAX_AGE are taken
+    from the cache, and nothing older is served when HLTB is unavailable.
+    """
+    results = search_cache.get(query, max_age=REFRESH_MAX_AGE if refresh else None)
+    CACHE_LOOKUPS.inc(result='miss' if results is None else 'hit')
+    if results is None:
+        logger.debug("HLTB cache miss for %r", query)
+        try:
+            results = flights.do(('search', normalize_query(query)), lambda: _search_upstream(query))
+        except HLTBUnavailable:
+            results = None if refresh else search_cache.get(query, allow_stale=True)
+            if results is None:
+                raise
+            logger.warning(f"HLTB unavailable, serving expired results for {query!r}")
+    return [SimpleNamespace(**result) for result in results]
+
+
+def _search_upstream(query):
+    results = [_entry_to_dict(entry) for entry in call_upstream('search', query)]
+    search_cache.put(query, results)
+    return results
+
+
+def suggest(query, limit=8):
+    """
+    Type-ahead suggestions for a partially typed title: (results, source).
+    Answered from related cached searches where possible (see
+    SearchCache.related), so typing a longer or shorter version of an
+    earlier query doesn't search again; otherwise searched like search()
+    with source 'hltb'. Queries shorter than SUGGEST_MIN_LENGTH get nothing.
+    """
+    if len(normalize_query(query)) < SUGGEST_MIN_LENGTH:
+        return [], None
+    related = search_cache.related(query)
+    if related is not None:
+        results, source = related
+        CACHE_LOOKUPS.inc(result='hit' if source == 'exact' else 'related')
+        results = [SimpleNamespace(**result) for result in results]
+    else:
+        results, source = search(query), 'hltb'
+    return results[:limit], source
+
+
+def search_by_id(game_id, refresh=False):
+    """Look a game up by HLTB id through the result cache. Returns None if unknown."""
+    key = f'id:{game_id}'
+    results = search_cache.get(key, max_age=REFRESH_MAX_AGE if refresh else None)
+    if results is None:
+        try:
+            results = flights.do(('search_from_id', game_id), lambda: _search_by_id_upstream(game_id))
+        except HLTBUnavailable:
+            results = None if refresh else search_cache.get(key, allow_stale=True)
+            if results is None:
+                raise
+    return SimpleNamespace(**results[0]) if results else None
+
+
+def _search_by_id_upstream(game_id):
+    entry = call_upstream('search_from_id', game_id)
+    results = [_entry_to_dict(entry)] if entry else []
+    search_cache.put(f'id:{game_id}', results)
+    return results
+
+
+def lookup_game(game_id, query=None, refresh=False):
+    """
+    Find a single game by id, preferring results of earlier searches. Falls
+    back to searching for `query` and picking the matching id, then to a
+    lookup by id. With refresh=True only recent answers from HLTB are used.
+    """
+    if not refresh:
+        result = search_cache.get_game(game_id)
+        if result is not None:
+            return SimpleNamespace(**result)
+    if query:
+        found = next((game for game in search(query, refresh) if game.game_id == game_id), None)
+        if found is not None:
+            return found
+    return search_by_id(game_id, refresh)
+
+
+def image_url(entry):
+    """Absolute poster URL of a search result, or None"""
+    url = getattr(entry, 'game_image_url', None)
+    if url and not url.startswith('http'):
+        url = f"https://howlongtobeat.com{url}"
+    return url or None
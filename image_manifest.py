@@ -0,0 +1,294 @@
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    game_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    source_url TEXT,
+    optimized INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_files_game ON files (game_id);
+CREATE INDEX IF NOT EXISTS idx_files_last_used ON files (last_used);
+CREATE TABLE IF NOT EXISTS refs (
+    game_id TEXT NOT NULL,
+    user TEXT NOT NULL,
+    PRIMARY KEY (game_id, user)
+);
+CREATE INDEX IF NOT EXISTS idx_refs_user ON refs (user);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# Files in the cache directory, relative to it. Variant names end in the
+# first 10 hex digits of their content's SHA-256.
+VARIANT_FILE = re.compile(r'^game_(.+)_(\d+)w_([0-9a-f]{10})\.(jpg|webp|avif)$')
+POSTER_FILE = re.compile(r'^game_(.+)\.jpg$')
+ORIGINAL_FILE = re.compile(r'^originals/game_([^.]+)$')
+
+# Buffered last-used times are written at most this often
+TOUCH_FLUSH_INTERVAL = 60
+
+
+def classify(path):
+    """(game id, kind) of a cache file from its relative path, or None for anything else"""
+    # Only names directly in the cache directory or originals/, so a
+    # classified path never leads out of it
+    directory, name = posixpath.split(path)
+    if directory not in ('', 'originals') or name in ('', '.', '..'):
+        return None
+    for pattern, kind in ((VARIANT_FILE, 'variant'), (ORIGINAL_FILE, 'original'), (POSTER_FILE, 'poster')):
+        match = pattern.match(path)
+        if match:
+            return match.group(1), kind
+    return None
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageManifest:
+    """
+    Record of every file in the poster cache: the game it belongs to, its
+    kind ('variant', 'poster' or 'original'), size, SHA-256, upstream URL,
+    whether it was optimized and when it was last used. images.py keeps it
+    up to date as it writes and removes files, so questions like "which
+    posters are missing" or "how big is the cache" don't touch the disk.
+
+    The cache is shared by every user, so the manifest also counts which
+    users have each game (see images.PosterRefs); files of games nobody
+    has are garbage.
+
+    reconcile() brings it back in line with the directory after files were
+    changed behind its back (or on first use with an existing cache). The
+    database is opened on first use, so importing this in a process pool
+    worker costs nothing.
+    """
+
+    def __init__(self, root, path):
+        self.root = root
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._touched = {}
+        self._flushed_at = time.time()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(MANIFEST_SCHEMA)
+        return self._conn
+
+    def record(self, path, game_id, kind, source_url=None, optimized=True):
+        """Add or replace the entry for a file that was just written"""
+        full_path = os.path.join(self.root, path)
+        stat = os.stat(full_path)
+        digest = file_digest(full_path)
+        with self._lock, self._db() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, str(game_id), kind, stat.st_size, stat.st_mtime_ns, digest,
+                 source_url, int(optimized), time.time())
+            )
+
+    def _contains(self, path):
+        """Whether `path` is a cache file name that resolves inside the root"""
+        root = os.path.realpath(self.root)
+        return (classify(path) is not None
+                and os.path.realpath(os.path.join(root, path)).startswith(root + os.sep))
+
+    def remove(self, paths):
+        """
+        Delete files and their entries; files already gone are fine. Paths
+        that aren't cache files (see classify()) are refused.
+        """
+        refused = [path for path in paths if not self._contains(path)]
+        if refused:
+            logger.warning(f"Refusing to remove files outside the poster cache: {refused}")
+            paths = [path for path in paths if path not in refused]
+        for path in paths:
+            try:
+                os.remove(os.path.join(self.root, path))
+            except FileNotFoundError:
+                pass
+        with self._lock, self._db() as db:
+            db.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in paths])
+
+    def touch(self, path):
+        """Note that a file was used. Buffered, see TOUCH_FLUSH_INTERVAL."""
+        now = time.time()
+        with self._lock:
+            self._touched[path] = now
+            if now - self._flushed_at < TOUCH_FLUSH_INTERVAL:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            self._flushed_at = time.time()
+            if touched:
+                with self._db() as db:
+                    db.executemany('UPDATE files SET last_used = MAX(last_used, ?) WHERE path = ?',
+                                   [(used, path) for path, used in touched.items()])
+
+    def get(self, path):
+        with self._lock:
+            return self._db().execute('SELECT * FROM files WHERE path = ?', (path,)).fetchone()
+
+    def entries(self, kind=None):
+        """Every entry (of one kind), least recently used first"""
+        self.flush()
+        sql = 'SELECT * FROM files'
+        params = ()
+        if kind is not None:
+            sql += ' WHERE kind = ?'
+            params = (kind,)
+        with self._lock:
+            return self._db().execute(sql + ' ORDER BY last_used', params).fetchall()
+
+    def paths(self):
+        with self._lock:
+            return {row[0] for row in self._db().execute('SELECT path FROM files')}
+
+    def total_size(self):
+        with self._lock:
+            return self._db().execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+    def game_files(self, game_id):
+        with self._lock:
+            return self._db().execute('SELECT * FROM files WHERE game_id = ? ORDER BY last_used',
+                                      (str(game_id),)).fetchall()
+
+    # References
+
+    def set_refs(self, user, game_ids):
+        """Replace the set of games a user has"""
+        with self._lock, self._db() as db:
+            db.execute('DELETE FROM refs WHERE user = ?', (user,))
+            db.executemany('INSERT OR IGNORE INTO refs VALUES (?, ?)', [(str(game_id), user) for game_id in game_ids])
+            db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (f'refs:{user}', time.time()))
+
+    def add_refs(self, user, game_ids):
+        with self._lock, self._db() as db:
+            db.executemany('INSERT OR IGNORE INTO refs VALUES (?, ?)', [(str(game_id), user) for game_id in game_ids])
+
+    def remove_refs(self, user, game_ids):
+        with self._lock, self._db() as db:
+            db.executemany('DELETE FROM refs WHERE game_id = ? AND user = ?',
+                           [(str(game_id), user) for game_id in game_ids])
+
+    def has_refs(self, user):
+        """Whether a user's games were ever recorded"""
+        with self._lock:
+            return self._get_meta(f'refs:{user}') is not None
+
+    def users_for(self, game_ids):
+        """{user: set of game ids} for the users that have any of these games"""
+        users = {}
+        with self._lock:
+            db = self._db()
+            for game_id in {str(game_id) for game_id in game_ids}:
+                for (user,) in db.execute('SELECT user FROM refs WHERE game_id = ?', (game_id,)):
+                    users.setdefault(user, set()).add(game_id)
+        return users
+
+    def referenced_ids(self):
+        """Game ids at least one user has"""
+        with self._lock:
+            return {row[0] for row in self._db().execute('SELECT DISTINCT game_id FROM refs')}
+
+    def _get_meta(self, key):
+        row = self._db().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def reconcile(self):
+        """
+        Compare the manifest with the cache directory: add files it doesn't
+        know, drop entries whose file is gone, and re-hash files whose size
+        or mtime changed. Variants whose content no longer matches the hash
+        in their name are corrupt and get deleted, so they count as missing.
+        Returns counts of what changed.
+        """
+        counts = {'added': 0, 'dropped': 0, 'rehashed': 0, 'corrupt': 0}
+        known = {row['path']: row for row in self.entries()}
+        seen = set()
+        for directory in (self.root, os.path.join(self.root, 'originals')):
+            try:
+                dir_entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for dir_entry in dir_entries:
+                if not dir_entry.is_file():
+                    continue
+                path = os.path.relpath(dir_entry.path, self.root).replace(os.sep, '/')
+                classified = classify(path)
+                if classified is None:
+                    continue
+                seen.add(path)
+                stat = dir_entry.stat()
+                row = known.get(path)
+                if row is not None and (row['size'], row['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+
+                digest = file_digest(dir_entry.path)
+                variant = VARIANT_FILE.match(path)
+                if variant and not digest.startswith(variant.group(3)):
+                    logger.warning(f"Removing corrupt poster {path}")
+                    self.remove([path])
+                    seen.discard(path)
+                    counts['corrupt'] += 1
+                    continue
+
+                game_id, kind = classified
+                # Files found on disk were optimized unless we recorded otherwise
+                optimized = row['optimized'] if row is not None else kind != 'original'
+                with self._lock, self._db() as db:
+                    db.execute(
+                        'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (path, game_id, kind, stat.st_size, stat.st_mtime_ns, digest,
+                         row['source_url'] if row is not None else None, optimized,
+                         row['last_used'] if row is not None else time.time())
+                    )
+                counts['rehashed' if row is not None else 'added'] += 1
+
+        gone = [path for path in known if path not in seen]
+        if gone:
+            with self._lock, self._db() as db:
+                db.executemany('DELETE FROM files WHERE path = ?', [(path,) for path in gone])
+        counts['dropped'] = len(gone)
+
+        with self._lock, self._db() as db:
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('reconciled_at', ?)", (time.time(),))
+        if any(counts.values()):
+            logger.info(f"Reconciled image manifest: {counts}")
+        return counts
+
+    def ensure_reconciled(self):
+        """Build the manifest from the directory if it never has been"""
+        with self._lock:
+            reconciled_at = self._get_meta('reconciled_at')
+        if reconciled_at is None:
+            self.reconcile()
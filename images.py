@@ -0,0 +1,560 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+from image_manifest import VARIANT_FILE, ImageManifest, classify
+from store import data_path
+
+try:
+    from PIL import Image, features
+except ImportError:  # Pillow is optional; ImageMagick is used instead
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join('static', 'game_images')
+
+# Untouched downloads, kept so posters can be re-encoded and refetched conditionally
+ORIGINALS_DIR = os.path.join(CACHE_DIR, 'originals')
+
+# URL prefix of everything in CACHE_DIR
+CACHE_URL = '/static/game_images/'
+
+# Record of the files in CACHE_DIR, see image_manifest.py
+manifest = ImageManifest(CACHE_DIR, os.environ.get('IMAGE_MANIFEST') or data_path('image_manifest.db'))
+
+# Evict cached files beyond this many bytes (0 means no limit)
+MAX_CACHE_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 0))
+
+# Files no game refers to are kept this long after their last use, so
+# undoing a delete (or a job that hasn't saved its records yet) finds them
+ORPHAN_GRACE = int(os.environ.get('IMAGE_ORPHAN_GRACE', 24 * 3600))
+
+# Posters are shrunk (never enlarged) to fit this box
+POSTER_SIZE = (400, 600)
+JPEG_QUALITY = 95
+
+# Responsive variants generated for each poster (widths in px, capped at POSTER_SIZE)
+VARIANT_WIDTHS = (200, 400)
+
+# format -> (Pillow encoder, file extension, save options)
+VARIANT_FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 60, 'speed': 6}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+FORMAT_BY_EXTENSION = {extension: name for name, (_, extension, _) in VARIANT_FORMATS.items()}
+
+# Hashed variant filenames never change content, so they can be cached forever
+HASHED_POSTER_URL = re.compile(r'^/static/game_images/game_\d+_\d+w_[0-9a-f]{10}\.(jpg|webp|avif)$')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# (connect, read) timeouts for poster downloads, in seconds
+TIMEOUT = (5, 30)
+
+# Downloads larger than this are aborted
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', 10 * 1024 * 1024))
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+DOWNLOAD_SECONDS = metrics.Histogram(
+    'image_download_seconds', 'Time spent downloading posters', ('outcome',))
+# Measured by the caller, so it includes waiting for a process pool worker
+PROCESSING_SECONDS = metrics.Histogram(
+    'image_processing_seconds',
+    'Time spent encoding posters: responsive variants, or the single Pillow/ImageMagick poster',
+    ('step', 'outcome'))
+
+
+class ImageDownloadError(Exception):
+    pass
+
+
+def _build_session():
+    """Shared session: keeps connections to the poster CDN alive and retries transient failures"""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('GET',))
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+http = _build_session()
+
+
+def optimize_with_pillow(source_path):
+    """Resize and re-encode an image"""
+    with Image.open(source_path) as image:
+        image.thumbnail(POSTER_SIZE, Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        # Metadata isn't carried over unless passed explicitly, so this also strips it
+        image.save(output, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def optimize_with_imagemagick(source_path):
+    """Same transformation through the `convert` binary, writing to stdout"""
+    result = subprocess.run([
+        'convert', source_path,
+        '-resize', f'{POSTER_SIZE[0]}x{POSTER_SIZE[1]}>',
+        '-quality', str(JPEG_QUALITY),
+        '-strip',
+        '-interlace', 'Plane',
+        'jpg:-'
+    ], capture_output=True, check=True)
+    return result.stdout
+
+
+def supported_formats():
+    """Variant formats the installed Pillow can encode, best first"""
+    if Image is None:
+        return []
+    return [name for name in VARIANT_FORMATS if name == 'jpeg' or features.check(name)]
+
+
+def build_variants(source_path):
+    """
+    Encode a downloaded poster at every width in VARIANT_WIDTHS and every
+    supported format. Returns a list of (format, width, bytes).
+
+    Module-level and free of app state so it can run in a worker process.
+    """
+    variants = []
+    with Image.open(source_path) as source:
+        poster = source.copy()
+    poster.thumbnail(POSTER_SIZE, Image.LANCZOS)
+    if poster.mode != 'RGB':
+        poster = poster.convert('RGB')
+
+    for width in VARIANT_WIDTHS:
+        if width < poster.width:
+            height = round(poster.height * width / poster.width)
+            image = poster.resize((width, height), Image.LANCZOS)
+        else:
+            image = poster
+        for name in supported_formats():
+            encoder, _, options = VARIANT_FORMATS[name]
+            output = io.BytesIO()
+            image.save(output, encoder, **options)
+            variants.append((name, image.width, output.getvalue()))
+        if width >= poster.width:
+            break
+    return variants
+
+
+def process_image(source_path):
+    """
+    Turn a downloaded image into an optimized poster. Returns (bytes,
+    optimized); if neither Pillow nor ImageMagick can handle the image the
+    original bytes are returned unoptimized.
+
+    Module-level and free of app state so it can run in a worker process.
+    """
+    if Image is not None:
+        try:
+            return optimize_with_pillow(source_path), True
+        except Exception as e:
+            logger.warning(f"Pillow could not process image, trying ImageMagick: {e}")
+    try:
+        return optimize_with_imagemagick(source_path), True
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.error(f"Error optimizing image: {e}")
+        with open(source_path, 'rb') as f:
+            return f.read(), False
+
+
+def process_pool():
+    """Shared process pool for CPU-bound image work in batch jobs"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn rather than fork: the web process has threads holding locks
+            _process_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        return _process_pool
+
+
+def _temp_suffix():
+    """Per process and thread, so concurrent writers of one file don't collide"""
+    return f'.{os.getpid()}-{threading.get_ident()}'
+
+
+def write_file(path, data):
+    """Write to a temp file and rename into place so readers never see a partial poster"""
+    temp_path = path + _temp_suffix() + '.temp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def original_path(game_id):
+    return os.path.join(ORIGINALS_DIR, f'game_{game_id}')
+
+
+def download(image_url, dest_path, source=None):
+    """
+    Stream an image to dest_path, capped at MAX_IMAGE_BYTES. When `source`
+    (a previous ImageSource record for the same URL) carries an ETag or
+    Last-Modified, the request is conditional and None is returned on a 304.
+    Otherwise returns the new ImageSource record.
+    """
+    headers = {}
+    if source and source.get('url') == image_url:
+        if source.get('etag'):
+            headers['If-None-Match'] = source['etag']
+        if source.get('last_modified'):
+            headers['If-Modified-Since'] = source['last_modified']
+
+    with http.get(image_url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+        if response.status_code == 304:
+            return None
+        if response.status_code != 200:
+            raise ImageDownloadError(f"HTTP {response.status_code}")
+
+        length = response.headers.get('Content-Length')
+        if length and int(length) > MAX_IMAGE_BYTES:
+            raise ImageDownloadError(f"Image too large ({length} bytes)")
+
+        part_path = dest_path + _temp_suffix() + '.part'
+        size = 0
+        try:
+            with open(part_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        raise ImageDownloadError(f"Image exceeds {MAX_IMAGE_BYTES} bytes")
+                    f.write(chunk)
+            os.replace(part_path, dest_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        return {
+            'url': image_url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }
+
+
+def cache_image(source_path, local_path, executor=None):
+    """Optimize a downloaded image (optionally on `executor`) and store it at local_path"""
+    with PROCESSING_SECONDS.time(step='poster'):
+        if executor is not None:
+            output, optimized = executor.submit(process_image, source_path).result()
+        else:
+            output, optimized = process_image(source_path)
+    write_file(local_path, output)
+    return optimized
+
+
+def local_poster_path(game_id):
+    """(filesystem path, URL path) of a game's single legacy poster"""
+    # Always use .jpg for output to ensure consistent format and compression
+    local_filename = f'game_{game_id}.jpg'
+    return os.path.join(CACHE_DIR, local_filename), f'/static/game_images/{local_filename}'
+
+
+def manifest_path(url):
+    """Manifest path of a cached poster URL, or None for anything else"""
+    if not url or not url.startswith(CACHE_URL):
+        return None
+    path = url[len(CACHE_URL):]
+    return path if classify(path) else None
+
+
+def _record(path, game_id, kind, source_url, optimized=True):
+    """Add a file just written under CACHE_DIR to the manifest"""
+    try:
+        manifest.record(os.path.relpath(path, CACHE_DIR).replace(os.sep, '/'), game_id, kind,
+                        source_url, optimized)
+    except (OSError, sqlite3.Error) as e:
+        # The poster itself is fine; the next reconcile picks it up
+        logger.error(f"Error recording {path} in the image manifest: {e}")
+
+
+def variant_urls(variants):
+    """Every file referenced by an ImageVariants record"""
+    return {entry['url'] for entries in (variants or {}).values() for entry in entries}
+
+
+def store_variants(source_path, game_id, executor=None, source_url=None):
+    """
+    Encode and store responsive variants of a poster under content-hashed
+    filenames. Returns the record fields {'ImageURL', 'ImageVariants'}, where
+    ImageURL is the largest JPEG. The files of earlier variants are left
+    alone until the records stop pointing at them, see discard_replaced().
+
+    Without Pillow, falls back to the single ImageMagick-optimized poster.
+    """
+    encoded = None
+    if Image is not None:
+        try:
+            with PROCESSING_SECONDS.time(step='variants'):
+                if executor is not None:
+                    encoded = executor.submit(build_variants, source_path).result()
+                else:
+                    encoded = build_variants(source_path)
+        except Exception as e:
+            logger.warning(f"Could not build variants for game {game_id}, using a single poster: {e}")
+
+    if encoded is None:
+        local_path, relative_path = local_poster_path(game_id)
+        optimized = cache_image(source_path, local_path, executor)
+        if not optimized:
+            logger.warning(f"Stored the unoptimized download as game {game_id}'s poster; "
+                           f"image maintenance will retry")
+        _record(local_path, game_id, 'poster', source_url, optimized)
+        return {'ImageURL': relative_path, 'ImageVariants': None}
+
+    variants = {}
+    for name, width, output in encoded:
+        digest = hashlib.sha256(output).hexdigest()[:10]
+        filename = f'game_{game_id}_{width}w_{digest}.{VARIANT_FORMATS[name][1]}'
+        path = os.path.join(CACHE_DIR, filename)
+        if not os.path.exists(path):
+            write_file(path, output)
+        _record(path, game_id, 'variant', source_url)
+        variants.setdefault(name, []).append({'width': width, 'url': f'{CACHE_URL}{filename}'})
+
+    return {'ImageURL': variants['jpeg'][-1]['url'], 'ImageVariants': variants}
+
+
+def fetch_and_store(image_url, game_id, executor=None, source=None):
+    """
+    Download a poster and (re)build its variants. Returns the record fields
+    to store on the game including ImageSource, or None if the upstream
+    image hasn't changed since `source` was recorded. Raises on failure.
+    """
+    os.makedirs(ORIGINALS_DIR, exist_ok=True)
+    source_path = original_path(game_id)
+
+    # Only trust a 304 if we still have the original it refers to
+    if not os.path.exists(source_path):
+        source = None
+
+    with DOWNLOAD_SECONDS.time():
+        new_source = download(image_url, source_path, source)
+    if new_source is None:
+        manifest.touch(f'originals/game_{game_id}')
+        return None
+    _record(source_path, game_id, 'original', image_url, optimized=False)
+
+    fields = store_variants(source_path, game_id, executor, image_url)
+    fields['ImageSource'] = new_source
+    return fields
+
+
+def download_and_cache_image(image_url, game_id, executor=None):
+    """
+    Download a poster and cache optimized variants locally. Returns the
+    record fields to store on the game, or {} on failure.
+    """
+    if not image_url:
+        return {}
+
+    logger.info(f"Attempting to cache image for game {game_id} from {image_url}")
+
+    try:
+        fields = fetch_and_store(image_url, game_id, executor)
+        logger.info(f"Successfully cached and optimized image for game {game_id}")
+        return fields
+    except Exception as e:
+        logger.error(f"Error caching image for game {game_id}: {str(e)}")
+        return {}
+
+
+def discard_replaced(previous, fields):
+    """
+    Remove the variant files of `previous` (an ImageVariants record) that
+    the new image `fields` no longer use. Call it once the records pointing
+    at the new files have been saved, so pages never reference a deleted file.
+    """
+    stale = [manifest_path(url) for url in variant_urls(previous) - variant_urls(fields.get('ImageVariants'))]
+    manifest.remove([path for path in stale if path])
+
+
+def poster_paths(game):
+    """Manifest paths of the poster files a game's record points at"""
+    paths = (manifest_path(url) for url in variant_urls(game.image_variants) | {game.image_url})
+    return {path for path in paths if path}
+
+
+def missing_posters(games):
+    """Games with a cached poster file that isn't in the manifest (so not on disk)"""
+    manifest.ensure_reconciled()
+    present = manifest.paths()
+    return [game for game in games if not poster_paths(game) <= present]
+
+
+def cached_poster(game_id):
+    """
+    Record fields for a game's poster if it's already in the cache because
+    another user has the game, or None. Saves downloading it again.
+    """
+    variants = {}
+    poster = None
+    source_url = None
+    # Least recently used first, so newer files win
+    for row in manifest.game_files(game_id):
+        match = VARIANT_FILE.match(row['path'])
+        if match:
+            name = FORMAT_BY_EXTENSION[match.group(4)]
+            variants.setdefault(name, {})[int(match.group(2))] = CACHE_URL + row['path']
+        elif row['kind'] == 'poster':
+            poster = CACHE_URL + row['path']
+        source_url = row['source_url'] or source_url
+
+    if 'jpeg' in variants:
+        variants = {name: [{'width': width, 'url': url} for width, url in sorted(urls.items())]
+                    for name, urls in variants.items()}
+        fields = {'ImageURL': variants['jpeg'][-1]['url'], 'ImageVariants': variants}
+    elif poster:
+        fields = {'ImageURL': poster, 'ImageVariants': None}
+    else:
+        return None
+    if source_url:
+        fields['ImageSource'] = {'url': source_url}
+    return fields
+
+
+class PosterRefs:
+    """
+    Store listener recording which games a user has in the manifest, so
+    cached files are kept while any user has their game.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._game_ids = None
+
+    def on_reset(self, games):
+        game_ids = {str(game.game_id) for game in games}
+        if self._game_ids is None:
+            manifest.set_refs(self.user, game_ids)
+        else:
+            manifest.add_refs(self.user, game_ids - self._game_ids)
+            manifest.remove_refs(self.user, self._game_ids - game_ids)
+        self._game_ids = game_ids
+
+    def on_change(self, before, after):
+        # Changes replayed from other processes were recorded by that process
+        if before is not None:
+            self._game_ids.discard(str(before.game_id))
+        if after is not None:
+            self._game_ids.add(str(after.game_id))
+
+    def on_commit(self, changes):
+        manifest.remove_refs(self.user, [before.game_id for before, after in changes
+                                         if before is not None and after is None])
+        manifest.add_refs(self.user, [after.game_id for before, after in changes if after is not None])
+
+
+def collect_garbage(grace=ORPHAN_GRACE):
+    """
+    Remove cached files of games no user has any more once they haven't
+    been used for `grace` seconds. Returns the removed paths.
+    """
+    referenced = manifest.referenced_ids()
+    cutoff = time.time() - grace
+    garbage = [row['path'] for row in manifest.entries()
+               if row['game_id'] not in referenced and row['last_used'] < cutoff]
+    manifest.remove(garbage)
+    if garbage:
+        logger.info(f"Removed {len(garbage)} unused poster files")
+    return garbage
+
+
+def reoptimize_posters(executor=None):
+    """
+    Retry optimizing posters that were stored as the raw download because
+    Pillow and ImageMagick both failed. Returns how many now are optimized.
+    """
+    fixed = 0
+    for row in manifest.entries('poster'):
+        if row['optimized']:
+            continue
+        local_path = os.path.join(CACHE_DIR, row['path'])
+        source_path = original_path(row['game_id'])
+        if not os.path.exists(source_path):
+            source_path = local_path
+        if cache_image(source_path, local_path, executor):
+            _record(local_path, row['game_id'], 'poster', row['source_url'])
+            fixed += 1
+    return fixed
+
+
+def enforce_quota(max_bytes=MAX_CACHE_BYTES):
+    """
+    Evict files until the cache fits in `max_bytes`: least recently used
+    originals first (which only makes the next refetch unconditional), then
+    every variant but the smallest JPEG of the least recently used games.
+    Returns ({game_id: fields} for games whose posters were trimmed, number
+    of files evicted).
+    """
+    total = manifest.total_size()
+    if not max_bytes or total <= max_bytes:
+        return {}, 0
+
+    evicted = 0
+    for row in manifest.entries('original'):
+        if total <= max_bytes:
+            break
+        manifest.remove([row['path']])
+        total -= row['size']
+        evicted += 1
+
+    changes = {}
+    by_game = {}
+    for row in manifest.entries('variant'):
+        by_game.setdefault(row['game_id'], []).append(row)
+    # Games whose posters were used least recently first
+    for game_id in sorted(by_game, key=lambda game_id: by_game[game_id][-1]['last_used']):
+        if total <= max_bytes:
+            break
+        rows = by_game[game_id]
+        jpegs = []
+        for row in rows:
+            match = VARIANT_FILE.match(row['path'])
+            if match.group(4) == 'jpg':
+                jpegs.append((int(match.group(2)), row['path']))
+        jpegs.sort()
+        if not jpegs or len(rows) == 1:
+            continue
+        width, keep = jpegs[0]
+        drop = [row for row in rows if row['path'] != keep]
+        manifest.remove([row['path'] for row in drop])
+        total -= sum(row['size'] for row in drop)
+        evicted += len(drop)
+        url = CACHE_URL + keep
+        changes[game_id] = {'ImageURL': url, 'ImageVariants': {'jpeg': [{'width': width, 'url': url}]}}
+
+    if total > max_bytes:
+        logger.warning(f"Image cache is still {total} bytes, over its {max_bytes} byte quota")
+    return changes, evicted
+
+
+def is_immutable(path):
+    """True for content-hashed poster URLs, which can be cached forever"""
+    return HASHED_POSTER_URL.match(path) is not None
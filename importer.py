@@ -0,0 +1,231 @@
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import hltb
+import images
+from name_index import normalize_name
+from records import STATUSES, Game
+
+logger = logging.getLogger(__name__)
+
+# Rows are resolved and their posters fetched on this many threads; HLTB
+# searches are still throttled by hltb.rate_limiter
+CONCURRENCY = int(os.environ.get('IMPORT_CONCURRENCY', 8))
+
+MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 5000))
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+def _row(index, name=None, game_id=None, status=None):
+    name = str(name).strip() if name not in (None, '') else None
+    if game_id in (None, ''):
+        game_id = None
+    else:
+        try:
+            game_id = int(game_id)
+        except (ValueError, TypeError):
+            raise InvalidImport(f"Row {index}: GameID must be an integer")
+    if name is None and game_id is None:
+        raise InvalidImport(f"Row {index}: needs a GameName or GameID")
+    status = status or 'Not Started'
+    if status not in STATUSES:
+        raise InvalidImport(f"Row {index}: unknown ProgressStatus {status!r}")
+    return {'row': index, 'name': name, 'game_id': game_id, 'status': status}
+
+
+def parse_json(body):
+    """A JSON list of titles, HLTB ids or {GameName, GameID, ProgressStatus} objects"""
+    try:
+        entries = json.loads(body)
+    except ValueError as e:
+        raise InvalidImport(f"Invalid JSON: {e}")
+    if not isinstance(entries, list):
+        raise InvalidImport("Expected a JSON list")
+
+    rows = []
+    for index, entry in enumerate(entries, 1):
+        if isinstance(entry, dict):
+            rows.append(_row(index, entry.get('GameName'), entry.get('GameID'), entry.get('ProgressStatus')))
+        elif isinstance(entry, int) and not isinstance(entry, bool):
+            rows.append(_row(index, game_id=entry))
+        elif isinstance(entry, str):
+            rows.append(_row(index, name=entry))
+        else:
+            raise InvalidImport(f"Row {index}: expected a title, an id or an object")
+    return rows
+
+
+def parse_csv(body):
+    """
+    CSV with a header row. GameName, GameID and ProgressStatus columns are
+    used when the header names them; otherwise the first column is the title.
+    """
+    reader = csv.reader(io.StringIO(body))
+    header = next(reader, None)
+    if header is None:
+        return []
+    header = [column.strip() for column in header]
+    named = {'GameName', 'GameID'} & set(header)
+
+    rows = []
+    for index, values in enumerate(reader, 1):
+        if not any(value.strip() for value in values):
+            continue
+        if named:
+            record = dict(zip(header, values))
+            rows.append(_row(index, record.get('GameName'), record.get('GameID'),
+                             (record.get('ProgressStatus') or '').strip() or None))
+        else:
+            rows.append(_row(index, name=values[0]))
+    return rows
+
+
+def parse_rows(body, content_type):
+    if content_type == 'application/json':
+        rows = parse_json(body)
+    elif content_type in ('text/csv', 'text/plain'):
+        rows = parse_csv(body)
+    else:
+        raise InvalidImport(f"Unsupported content type {content_type!r}, send text/csv or application/json")
+    if len(rows) > MAX_ROWS:
+        raise InvalidImport(f"Too many rows ({len(rows)}), the limit is {MAX_ROWS}")
+    return rows
+
+
+def best_match(name, results):
+    """The search result for `name`: an exact title match, else the most similar"""
+    wanted = normalize_name(name)
+    exact = next((entry for entry in results if normalize_name(entry.game_name) == wanted), None)
+    if exact is not None:
+        return exact
+    return max(results, key=lambda entry: entry.similarity or 0, default=None)
+
+
+def resolve(row):
+    """Find a row's game on HLTB, or None"""
+    if row['game_id'] is not None:
+        return hltb.lookup_game(row['game_id'], row['name'])
+    return best_match(row['name'], hltb.search(row['name']))
+
+
+def game_from_hltb(game_info, image_fields, status='Not Started'):
+    """Build a new collection record from an HLTB search result"""
+    hours = None
+    if getattr(game_info, 'main_story', None):
+        hours = round(float(game_info.main_story))
+    release_year = None
+    if getattr(game_info, 'release_world', None):
+        release_year = int(game_info.release_world)
+    return Game(
+        game_id=game_info.game_id,
+        name=game_info.game_name,
+        hours=hours,
+        released=hours is not None,
+        status=status,
+        image_url=image_fields.get('ImageURL', ''),
+        image_variants=image_fields.get('ImageVariants'),
+        image_source=image_fields.get('ImageSource'),
+        release_year=release_year,
+        date_added=datetime.now()
+    )
+
+
+def _input_key(row):
+    if row['game_id'] is not None:
+        return ('id', row['game_id'])
+    return ('name', normalize_name(row['name']))
+
+
+def run_import(rows, game_store):
+    """
+    Resolve rows against HLTB and fetch their posters concurrently, yielding
+    a result dict per row as it completes. New games are then added to the
+    store in a single write, and a final summary is yielded.
+
+    Rows repeating an earlier row, resolving to a game already claimed by
+    another row, or already in the collection are reported as duplicates.
+    Stopping the generator early cancels outstanding rows and adds nothing.
+    """
+    started = time.time()
+    counts = Counter()
+    new_games = []
+    claimed = set()
+    lock = threading.Lock()
+
+    def process(row):
+        game_info = resolve(row)
+        if game_info is None:
+            return {'status': 'not_found'}
+
+        release_year = int(game_info.release_world) if getattr(game_info, 'release_world', None) else None
+        with lock:
+            duplicate = (game_info.game_id in claimed
+                         or game_store.get(game_info.game_id) is not None
+                         or game_store.find(game_info.game_name, release_year) is not None)
+            if not duplicate:
+                claimed.add(game_info.game_id)
+        if duplicate:
+            return {'status': 'duplicate', 'GameID': game_info.game_id, 'GameName': game_info.game_name}
+
+        image_url = hltb.image_url(game_info)
+        # Reuse the poster if another user already has the game
+        image_fields = images.cached_poster(game_info.game_id) if image_url else None
+        if image_fields is None:
+            image_fields = images.download_and_cache_image(image_url, game_info.game_id, images.process_pool()) if image_url else {}
+        return {'status': 'ready', 'game': game_from_hltb(game_info, image_fields, row['status'])}
+
+    unique = []
+    seen = {}
+    for row in rows:
+        key = _input_key(row)
+        if key in seen:
+            counts['duplicate'] += 1
+            yield {'row': row['row'], 'input': row['name'] or row['game_id'], 'status': 'duplicate',
+                   'message': f"Same as row {seen[key]}"}
+        else:
+            seen[key] = row['row']
+            unique.append(row)
+
+    executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+    try:
+        futures = {executor.submit(process, row): row for row in unique}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error importing row {row['row']} ({row['name'] or row['game_id']}): {e}")
+                result = {'status': 'error', 'message': str(e)}
+
+            counts[result['status']] += 1
+            game = result.pop('game', None)
+            if game is not None:
+                new_games.append(game)
+                result.update(GameID=game.game_id, GameName=game.name)
+            yield dict(result, row=row['row'], input=row['name'] or row['game_id'])
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    game_store.add_many(new_games)
+    logger.info(f"Imported {len(new_games)} of {len(rows)} games in {time.time() - started:.1f}s")
+
+    yield {
+        'done': True,
+        'added': len(new_games),
+        'duplicates': counts['duplicate'],
+        'not_found': counts['not_found'],
+        'failed': counts['error'],
+        'total': len(rows),
+        'elapsed_seconds': round(time.time() - started, 1),
+    }
@@ -0,0 +1,331 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Running jobs publish their progress to the registry at most this often
+PUBLISH_INTERVAL = 0.5
+
+# ...and check for cancellation requested through another process this often
+CANCEL_POLL_INTERVAL = 1.0
+
+# Running jobs' heartbeats are refreshed this often; a job whose heartbeat is
+# older than HEARTBEAT_TIMEOUT belonged to a worker that died and is failed
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 60
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_kind_status ON jobs (kind, status);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job function once cancellation has been requested"""
+
+
+class JobAlreadyRunning(Exception):
+    def __init__(self, job):
+        super().__init__(f"A {job.kind} job is already running")
+        self.job = job
+
+
+class Job:
+    """
+    State of a single background job. Job functions receive their Job and
+    report through set_total/advance/fail, and should call check_cancelled()
+    between units of work.
+    """
+
+    # Cap on the per-item failures kept for reporting
+    MAX_FAILURES = 100
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.total = None
+        self.done = 0
+        self.failed = 0
+        self.failures = []
+        self.result = None
+        self.error = None
+        self._cancel = threading.Event()
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+        # Set by the JobManager running this job
+        self._manager = None
+        self._published_at = 0
+        self._cancel_polled_at = 0
+
+    @property
+    def running(self):
+        return self.status in ('queued', 'running')
+
+    @property
+    def cancel_requested(self):
+        if not self._cancel.is_set() and self._manager and self.running:
+            now = time.time()
+            if now - self._cancel_polled_at >= CANCEL_POLL_INTERVAL:
+                self._cancel_polled_at = now
+                if self._manager._cancel_flag(self.id):
+                    self._cancel.set()
+        return self._cancel.is_set()
+
+    def set_total(self, total):
+        self.total = total
+        self._changed()
+
+    def advance(self, count=1):
+        with self._lock:
+            self.done += count
+        self._changed()
+
+    def fail(self, item, error):
+        """Record a failed item; it still counts towards progress"""
+        with self._lock:
+            self.done += 1
+            self.failed += 1
+            if len(self.failures) < self.MAX_FAILURES:
+                self.failures.append({'item': item, 'error': str(error)})
+        self._changed()
+
+    def _changed(self):
+        if self._manager and time.time() - self._published_at >= PUBLISH_INTERVAL:
+            self._manager._publish(self)
+
+    def cancel(self):
+        self._cancel.set()
+        if self._manager:
+            self._manager._publish(self)
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns whether it did within `timeout`"""
+        return self._finished.wait(timeout)
+
+    def eta(self):
+        """Seconds remaining, extrapolated from the rate so far"""
+        if self.status != 'running' or not self.total or not self.done:
+            return None
+        elapsed = time.time() - self.started_at
+        return round(elapsed / self.done * (self.total - self.done), 1)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'total': self.total,
+            'done': self.done,
+            'failed': self.failed,
+            'failures': list(self.failures),
+            'eta_seconds': self.eta(),
+            'cancel_requested': self.cancel_requested,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class RemoteJob:
+    """
+    Read-only view of a job running in (or left behind by) another worker
+    process, as last published to the registry. cancel() asks its owner to
+    stop at its next check.
+    """
+
+    def __init__(self, manager, row):
+        self._manager = manager
+        self._state = json.loads(row['state'])
+        self.id = row['id']
+        self.kind = row['kind']
+        self.status = row['status']
+        self.cancel_requested = bool(row['cancel_requested'])
+
+    @property
+    def running(self):
+        return self.status in ('queued', 'running')
+
+    def cancel(self):
+        self._manager._request_cancel(self.id)
+        self.cancel_requested = True
+
+    def to_dict(self):
+        return dict(self._state, status=self.status, cancel_requested=self.cancel_requested)
+
+
+class JobManager:
+    """
+    Runs admin operations on background threads, one job per kind at a time,
+    and keeps the last `history` jobs around for status polling.
+
+    Jobs are recorded in a SQLite registry at `path`, so with several worker
+    processes a job started by one can be polled and cancelled through any of
+    them, and the one-per-kind rule holds across all of them. Without a path
+    the registry is in memory and private to this process.
+    """
+
+    def __init__(self, history=50, path=None):
+        self.history = history
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+        self._db = sqlite3.connect(path or ':memory:', timeout=30, check_same_thread=False,
+                                   isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript(JOBS_SCHEMA)
+
+    def start(self, kind, fn, *args, **kwargs):
+        """
+        Start `fn(job, *args, **kwargs)` on a background thread. Whatever it
+        returns becomes job.result. Raises JobAlreadyRunning if a job of the
+        same kind hasn't finished yet, in this process or another.
+        """
+        job = Job(kind)
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._expire_stale()
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE kind = ? AND status IN ('queued', 'running')", (kind,)
+                ).fetchone()
+                if row is not None:
+                    raise JobAlreadyRunning(self._jobs.get(row['id']) or RemoteJob(self, row))
+                self._db.execute(
+                    'INSERT INTO jobs VALUES (?, ?, ?, ?, ?, 0, ?)',
+                    (job.id, kind, job.status, job.created_at, time.time(), json.dumps(job.to_dict()))
+                )
+                self._prune()
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            job._manager = self
+            self._jobs[job.id] = job
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+        thread = threading.Thread(target=self._run, args=(job, fn, args, kwargs),
+                                  name=f'job-{kind}-{job.id}', daemon=True)
+        thread.start()
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = 'running'
+        job.started_at = time.time()
+        self._publish(job)
+        logger.info(f"Started {job.kind} job {job.id}")
+        try:
+            job.result = fn(job, *args, **kwargs)
+            job.status = 'cancelled' if job.cancel_requested else 'succeeded'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.exception(f"{job.kind} job {job.id} failed")
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._publish(job)
+            job._finished.set()
+            logger.info(f"{job.kind} job {job.id} {job.status} after {job.finished_at - job.started_at:.1f}s "
+                        f"({job.done}/{job.total} done, {job.failed} failed)")
+
+    def _publish(self, job):
+        """Write a local job's current state to the registry"""
+        job._published_at = time.time()
+        state = json.dumps(job.to_dict())
+        with self._lock:
+            # cancel_requested only ever goes from 0 to 1, whoever sets it
+            self._db.execute(
+                'UPDATE jobs SET status = ?, heartbeat = ?, state = ?, '
+                'cancel_requested = MAX(cancel_requested, ?) WHERE id = ?',
+                (job.status, time.time(), state, int(job._cancel.is_set()), job.id)
+            )
+            if not job.running:
+                self._jobs.pop(job.id, None)
+
+    def _beat(self):
+        """
+        Keep local running jobs' heartbeats fresh, even between progress
+        updates. Exits once none are left; start() starts it again.
+        """
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                ids = list(self._jobs)
+                if not ids:
+                    self._heartbeat = None
+                    return
+                self._db.execute(
+                    f"UPDATE jobs SET heartbeat = ? WHERE id IN ({','.join('?' * len(ids))})",
+                    [time.time()] + ids
+                )
+
+    def _expire_stale(self):
+        """Fail jobs whose worker stopped sending heartbeats"""
+        for row in self._db.execute(
+                "SELECT * FROM jobs WHERE status IN ('queued', 'running') AND heartbeat < ?",
+                (time.time() - HEARTBEAT_TIMEOUT,)).fetchall():
+            state = dict(json.loads(row['state']), status='failed', error='Worker exited', finished_at=time.time())
+            self._db.execute("UPDATE jobs SET status = 'failed', state = ? WHERE id = ?",
+                             (json.dumps(state), row['id']))
+            logger.warning(f"Marked {row['kind']} job {row['id']} failed, its worker stopped responding")
+
+    def _prune(self):
+        """Drop finished jobs beyond the newest `history`"""
+        self._db.execute(
+            "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND id NOT IN "
+            "(SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?)", (self.history,)
+        )
+
+    def _cancel_flag(self, job_id):
+        with self._lock:
+            row = self._db.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def _request_cancel(self, job_id):
+        with self._lock:
+            self._db.execute('UPDATE jobs SET cancel_requested = 1 WHERE id = ?', (job_id,))
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job
+            row = self._db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return RemoteJob(self, row) if row is not None else None
+
+    def last_started(self, kind):
+        """When the newest job of a kind was started, by any process (None if never)"""
+        with self._lock:
+            row = self._db.execute('SELECT MAX(created_at) FROM jobs WHERE kind = ?', (kind,)).fetchone()
+        return row[0]
+
+    def recent(self):
+        """All known jobs, newest first"""
+        with self._lock:
+            rows = self._db.execute('SELECT * FROM jobs ORDER BY created_at DESC').fetchall()
+            return [self._jobs.get(row['id']) or RemoteJob(self, row) for row in rows]
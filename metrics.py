@@ -0,0 +1,203 @@
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds, from cache hits up to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# With several worker processes, each one writes its metrics here and
+# /metrics adds them all up; without it metrics are per process
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
+# How often a process writes its metrics to METRICS_DIR
+FLUSH_INTERVAL = 5
+
+_registry = []
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def snapshot(self):
+        """{label values: state}, a copy safe to serialize"""
+        with self._lock:
+            return {key: self._copy(state) for key, state in self._values.items()}
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    @staticmethod
+    def _copy(state):
+        return state
+
+    @staticmethod
+    def merge(state, other):
+        return state + other
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+        _start_flusher()
+
+    def samples(self, key, state):
+        yield self.name + '_total', {}, state
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    @staticmethod
+    def _copy(state):
+        return list(state)
+
+    @staticmethod
+    def merge(state, other):
+        return [a + b for a, b in zip(state, other)]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # One count per bucket plus +Inf, then the sum of observed values
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+        _start_flusher()
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the block. If the metric has an `outcome`
+        label it is set to 'ok', or 'error' when the block raises.
+        """
+        started = time.perf_counter()
+        outcome = 'ok'
+        try:
+            yield
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            if 'outcome' in self.labelnames:
+                labels['outcome'] = outcome
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self, key, state):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), state):
+            cumulative += count
+            yield self.name + '_bucket', {'le': _format_bound(bound)}, cumulative
+        yield self.name + '_sum', {}, state[-1]
+        yield self.name + '_count', {}, cumulative
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _snapshot():
+    return {metric.name: [[list(key), state] for key, state in metric.snapshot().items()]
+            for metric in _registry}
+
+
+def flush():
+    """Write this process's metrics to METRICS_DIR, if set"""
+    if not METRICS_DIR:
+        return
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f'metrics-{os.getpid()}.json')
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(temp_path, path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Error writing metrics: {e}")
+
+
+def _start_flusher():
+    """Start writing to METRICS_DIR once this process has recorded something"""
+    global _flusher
+    if not METRICS_DIR or _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+            _flusher.start()
+
+
+def _collect():
+    """{metric name: {label values: state}} over all processes sharing METRICS_DIR"""
+    if not METRICS_DIR:
+        return {metric.name: metric.snapshot() for metric in _registry}
+
+    flush()
+    metrics = {metric.name: metric for metric in _registry}
+    merged = {name: {} for name in metrics}
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')):
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, entries in snapshot.items():
+            metric = metrics.get(name)
+            if metric is None:
+                continue
+            for key, state in entries:
+                key = tuple(key)
+                values = merged[name]
+                values[key] = metric.merge(values[key], state) if key in values else state
+    return merged
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    values = _collect()
+    lines = []
+    for metric in _registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for key, state in sorted(values.get(metric.name, {}).items()):
+            labels = dict(zip(metric.labelnames, key))
+            for sample, extra, value in metric.samples(key, state):
+                pairs = ','.join(f'{name}="{_escape(str(label))}"' for name, label in {**labels, **extra}.items())
+                lines.append(f'{sample}{{{pairs}}} {value}' if pairs else f'{sample} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,18 @@
+import os
+import sys
+from store import SqliteGameStore, data_path, migrate_json_to_sqlite
+
+def migrate():
+    json_path = sys.argv[1] if len(sys.argv) > 1 else os.environ.get('GAMES_DATA') or data_path('games_data.json')
+    db_path = sys.argv[2] if len(sys.argv) > 2 else os.environ.get('GAMES_DB') or data_path('games_data.db')
+
+    db_store = SqliteGameStore(db_path)
+    if not db_store.is_empty():
+        print(f"{db_path} already contains games, refusing to overwrite")
+        sys.exit(1)
+
+    count = migrate_json_to_sqlite(json_path, db_store)
+    print(f"Imported {count} games into {db_path}")
+
+if __name__ == "__main__":
+    migrate()
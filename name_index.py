@@ -0,0 +1,179 @@
+import itertools
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+# Queries shorter than this (after normalization) aren't worth a fuzzy lookup
+MIN_QUERY_LENGTH = 2
+
+# Results must contain at least this share of the query's trigrams
+MIN_SEARCH_SCORE = 0.5
+
+# Names at least this similar (Jaccard over trigrams) are flagged as likely
+# duplicates, as are names whose trigrams are almost all contained in the other
+DUPLICATE_SIMILARITY = 0.5
+DUPLICATE_CONTAINMENT = 0.9
+
+# Only names sharing at least this share of the new name's trigrams are
+# considered as duplicates, which keeps the lookup to rare posting lists
+DUPLICATE_MIN_SHARED = 0.4
+
+# At most this many names are scored per lookup. Queries made only of
+# common trigrams (" th", "the", "  3"...) narrow a sample of
+# MAX_CANDIDATES * CANDIDATE_SAMPLE names down to those sharing the most
+MAX_CANDIDATES = 200
+CANDIDATE_SAMPLE = 5
+
+
+def normalize_name(name):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+
+def trigrams(name, prefix=False):
+    """
+    Trigrams of each word padded with two leading spaces and one trailing
+    one (as PostgreSQL's pg_trgm does). With prefix=True the last word isn't
+    end-padded, so a partially typed word matches longer names.
+    """
+    words = normalize_name(name).split()
+    grams = set()
+    for i, word in enumerate(words):
+        padded = '  ' + word if prefix and i == len(words) - 1 else '  ' + word + ' '
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """
+    Trigram index over game names for ranked fuzzy search and near-duplicate
+    detection. A store listener (see subscribe() on the stores), so it stays
+    current as games are added, renamed or deleted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._postings = defaultdict(set)
+        self._grams = {}
+        self._games = {}
+
+    def _add(self, game):
+        key = str(game.game_id)
+        grams = trigrams(game.name)
+        self._games[key] = game
+        self._grams[key] = grams
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def _remove(self, game):
+        key = str(game.game_id)
+        self._games.pop(key, None)
+        for gram in self._grams.pop(key, ()):
+            keys = self._postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self._postings[gram]
+
+    def on_reset(self, games):
+        with self._lock:
+            self._clear()
+            for game in games:
+                self._add(game)
+
+    def on_change(self, before, after):
+        with self._lock:
+            if before is not None:
+                self._remove(before)
+            if after is not None:
+                self._add(after)
+
+    def _candidates(self, grams, min_shared):
+        """
+        At most MAX_CANDIDATES keys likely to share `min_shared` of `grams`.
+        Any such name contains one of the len(grams) - min_shared + 1 rarest
+        grams, so when those posting lists are short their union is the
+        exact answer. Otherwise short lists are taken whole (they catch names
+        a mistyped gram shares) and a sample of the next rarest is
+        intersected with the others until few names are left, skipping grams
+        no remaining name has.
+        """
+        postings = sorted((self._postings[gram] for gram in grams if gram in self._postings), key=len)
+        if len(postings) < min_shared:
+            return set()
+        selected = postings[:len(postings) - min_shared + 1]
+        if sum(len(keys) for keys in selected) <= MAX_CANDIDATES:
+            return set().union(*selected)
+
+        candidates = set()
+        while len(candidates) + len(postings[0]) <= MAX_CANDIDATES // 2:
+            candidates |= postings.pop(0)
+        room = MAX_CANDIDATES - len(candidates)
+        keys = set(itertools.islice(postings[0], MAX_CANDIDATES * CANDIDATE_SAMPLE))
+        for more_keys in postings[1:]:
+            if len(keys) <= room:
+                break
+            narrowed = keys & more_keys
+            if narrowed:
+                keys = narrowed
+        candidates.update(itertools.islice(keys, room))
+        return candidates
+
+    def search(self, query, limit=10):
+        """
+        Games whose names best match `query`, as (game, score) pairs with
+        the best first. The score is the share of the query's trigrams found
+        in the name, ties broken by overall similarity.
+        """
+        if len(normalize_name(query)) < MIN_QUERY_LENGTH:
+            return []
+        grams = trigrams(query, prefix=True)
+        min_shared = math.ceil(len(grams) * MIN_SEARCH_SCORE)
+
+        with self._lock:
+            results = []
+            for key in self._candidates(grams, min_shared):
+                name_grams = self._grams[key]
+                shared = len(grams & name_grams)
+                if shared < min_shared:
+                    continue
+                score = shared / len(grams)
+                similarity = shared / (len(grams) + len(name_grams) - shared)
+                results.append((score, similarity, self._games[key]))
+
+        results.sort(key=lambda result: (-result[0], -result[1], result[2].name.lower()))
+        return [(game, round(score, 3)) for score, _, game in results[:limit]]
+
+    def similar(self, name, release_year=None, limit=5):
+        """
+        Games that look like duplicates of `name`: very similar names, or one
+        name (nearly) contained in the other, e.g. "The Witcher 3" and "The
+        Witcher 3: Wild Hunt". When release_year is given, games released in
+        a different year are ignored.
+        """
+        grams = trigrams(name)
+        if not grams:
+            return []
+
+        with self._lock:
+            results = []
+            min_shared = max(2, math.ceil(len(grams) * DUPLICATE_MIN_SHARED))
+            for key in self._candidates(grams, min(min_shared, len(grams))):
+                game = self._games[key]
+                if release_year and game.release_year and game.release_year != release_year:
+                    continue
+                name_grams = self._grams[key]
+                shared = len(grams & name_grams)
+                similarity = shared / (len(grams) + len(name_grams) - shared)
+                containment = shared / min(len(grams), len(name_grams))
+                if similarity >= DUPLICATE_SIMILARITY or containment >= DUPLICATE_CONTAINMENT:
+                    results.append((similarity, game))
+
+        results.sort(key=lambda result: -result[0])
+        return [game for _, game in results[:limit]]
@@ -0,0 +1,154 @@
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+UNRELEASED = 'Unreleased'
+
+STATUSES = ('Not Started', 'In Progress', 'Complete', 'Tabled')
+
+
+def parse_hours(value):
+    """
+    Parse a stored HowLongToBeat value (number, numeric string or
+    "Unreleased") into (hours, released).
+    """
+    if value == UNRELEASED:
+        return None, False
+    try:
+        return float(value), True
+    except (ValueError, TypeError):
+        return None, True
+
+
+def _pop_datetime(data, key):
+    """Pop an ISO timestamp from a record; unparseable values are left in place"""
+    value = data.pop(key, None)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (ValueError, TypeError):
+        # Keep unparseable dates as-is rather than dropping them
+        data[key] = value
+        return None
+
+
+def _number(hours):
+    """Write whole hours as ints, as add_game always has"""
+    return int(hours) if hours.is_integer() else hours
+
+
+class Game:
+    """
+    A game in the collection. HowLongToBeat, GameID and DateAdded are parsed
+    once when a record is loaded; to_dict() and to_json() turn it back into
+    the JSON shape used on disk and by the frontend.
+
+    Games are shared between readers, so treat them as immutable and use
+    replace() (or the store's write methods) to change a field.
+    """
+
+    __slots__ = ('game_id', 'name', 'hours', 'released', 'status', 'image_url',
+                 'release_year', 'date_added', 'image_variants', 'image_source',
+                 'last_checked', 'extra')
+
+    def __init__(self, game_id, name, hours=None, released=True, status='Not Started',
+                 image_url='', release_year=None, date_added=None,
+                 image_variants=None, image_source=None, last_checked=None, extra=None):
+        self.game_id = game_id
+        self.name = name
+        self.hours = float(hours) if hours is not None else None
+        self.released = released
+        self.status = status
+        self.image_url = image_url
+        self.release_year = release_year
+        self.date_added = date_added
+        self.image_variants = image_variants
+        self.image_source = image_source
+        # When the game was last refreshed from HLTB
+        self.last_checked = last_checked
+        # Any other fields found in the record, kept so they round-trip
+        self.extra = extra or None
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        value = data.pop('HowLongToBeat', None)
+        # Snapshots written by older versions carry the rounded display
+        # value in HowLongToBeat and the original in HowLongToBeatRaw
+        if 'HowLongToBeatRaw' in data:
+            value = data.pop('HowLongToBeatRaw')
+        hours, released = parse_hours(value)
+
+        game_id = data.pop('GameID')
+        try:
+            game_id = int(game_id)
+        except (ValueError, TypeError):
+            logger.warning(f"Keeping non-integer GameID {game_id!r}")
+
+        date_added = _pop_datetime(data, 'DateAdded')
+        last_checked = _pop_datetime(data, 'LastChecked')
+
+        return cls(
+            game_id=game_id,
+            name=data.pop('GameName'),
+            hours=hours,
+            released=released,
+            status=data.pop('ProgressStatus', 'Not Started'),
+            image_url=data.pop('ImageURL', '') or '',
+            release_year=data.pop('ReleaseYear', None),
+            date_added=date_added,
+            image_variants=data.pop('ImageVariants', None),
+            image_source=data.pop('ImageSource', None),
+            last_checked=last_checked,
+            extra=data,
+        )
+
+    def to_dict(self):
+        """The record as stored on disk"""
+        data = {
+            'GameID': self.game_id,
+            'GameName': self.name,
+            'HowLongToBeat': self.stored_hours,
+            'ProgressStatus': self.status,
+            'ImageURL': self.image_url,
+            'ReleaseYear': self.release_year,
+        }
+        if self.image_variants is not None:
+            data['ImageVariants'] = self.image_variants
+        if self.image_source is not None:
+            data['ImageSource'] = self.image_source
+        if self.date_added is not None:
+            data['DateAdded'] = self.date_added.isoformat()
+        if self.last_checked is not None:
+            data['LastChecked'] = self.last_checked.isoformat(timespec='seconds')
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def to_json(self):
+        """The record as sent to templates and the frontend, with display hours"""
+        data = self.to_dict()
+        if self.hours is not None:
+            data['HowLongToBeat'] = str(round(self.hours))
+            data['HowLongToBeatRaw'] = _number(self.hours)
+        return data
+
+    @property
+    def stored_hours(self):
+        if not self.released:
+            return UNRELEASED
+        return _number(self.hours) if self.hours is not None else None
+
+    @property
+    def added_key(self):
+        """DateAdded as a sortable string, '' for games without one"""
+        return self.date_added.isoformat() if self.date_added else ''
+
+    def replace(self, fields):
+        """A copy with some fields (in their JSON names) changed"""
+        return Game.from_dict(dict(self.to_dict(), **fields))
+
+    def __repr__(self):
+        return f'Game({self.game_id!r}, {self.name!r}, status={self.status!r})'
@@ -0,0 +1,55 @@
+import heapq
+import os
+from datetime import datetime, timedelta
+
+# Scheduled refreshes run every REFRESH_INTERVAL seconds (0 disables them)
+# and re-check at most REFRESH_BATCH of the stalest games each time
+REFRESH_INTERVAL = int(os.environ.get('HLTB_REFRESH_INTERVAL', 1800))
+REFRESH_BATCH = int(os.environ.get('HLTB_REFRESH_BATCH', 25))
+
+# Games released this many years ago or since count as recent releases
+RECENT_YEARS = 1
+
+# How long a game's HLTB data is trusted before it is due again, by tier:
+# unreleased, recently released, still to play, and settled (completed or
+# tabled games released a while ago)
+INTERVALS = (
+    timedelta(days=1),
+    timedelta(days=7),
+    timedelta(days=30),
+    timedelta(days=180),
+)
+
+
+def tier(game, now):
+    """Refresh priority of a game, 0 (most likely to change) to 3"""
+    if not game.released:
+        return 0
+    if game.release_year and game.release_year >= now.year - RECENT_YEARS:
+        return 1
+    if game.status in ('Not Started', 'In Progress'):
+        return 2
+    return 3
+
+
+def due_games(games, limit=None, now=None):
+    """
+    Games whose HLTB data is older than their tier's interval, most overdue
+    (relative to the interval) first. Games never checked come first,
+    unreleased and newer ones ahead of the rest.
+    """
+    now = now or datetime.now()
+    due = []
+    for index, game in enumerate(games):
+        game_tier = tier(game, now)
+        if game.last_checked is None:
+            overdue = float('inf')
+        else:
+            age = now - game.last_checked
+            if age < INTERVALS[game_tier]:
+                continue
+            overdue = age / INTERVALS[game_tier]
+        # The index keeps games themselves out of the comparison
+        due.append((-overdue, game_tier, -(game.release_year or 0), index, game))
+    entries = heapq.nsmallest(limit, due) if limit is not None else sorted(due)
+    return [entry[-1] for entry in entries]
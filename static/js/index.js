@@ -1,7 +1,8 @@
 // Global variables and event listeners
 document.addEventListener('DOMContentLoaded', () => {
-    sortGames();
-    renderGames(true);
+    // The first page is already rendered server-side
+    games = INITIAL_PAGE.games;
+    nextCursor = INITIAL_PAGE.next_cursor;
     loadFilters();
     loadDisplayOptions();
     
@@ -16,11 +17,14 @@ document.addEventListener('DOMContentLoaded', () => {
         setupEventListeners();
     }
 
+    // Keep the grid in sync with edits made here, in other tabs or by jobs
+    connectEvents(EVENTS_SINCE);
+
     // Setup infinite scroll
     const observer = new IntersectionObserver((entries) => {
         entries.forEach(entry => {
             if (entry.isIntersecting) {
-                renderGames(false);
+                loadNextPage();
             }
         });
     });
@@ -37,8 +41,7 @@ const imageObserver = new IntersectionObserver((entries, observer) => {
         if (entry.isIntersecting) {
             const img = entry.target;
             if (img.dataset.src) {
-                img.src = img.dataset.src;
-                img.removeAttribute('data-src');
+                loadPoster(img);
                 observer.unobserve(img);
             }
         }
@@ -48,6 +51,58 @@ const imageObserver = new IntersectionObserver((entries, observer) => {
     threshold: 0.1
 });
 
+// Game names come from HowLongToBeat and CSV imports; never treat them as markup
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, char => `&#${char.charCodeAt(0)};`);
+}
+
+// Poster helpers: responsive variants are {format: [{width, url}]}, smallest first
+function srcsetFor(entries) {
+    return entries.map(entry => `${entry.url} ${entry.width}w`).join(', ');
+}
+
+function smallestPoster(game) {
+    const jpegs = game.ImageVariants?.jpeg;
+    return jpegs && jpegs.length ? jpegs[0].url : game.ImageURL;
+}
+
+// Markup for a lazily loaded poster; loadPoster() swaps the data-* attributes in
+function posterMarkup(game) {
+    const placeholder = "data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 150 225'%3E%3C/svg%3E";
+    const variants = game.ImageVariants;
+    const img = `<img data-src="${game.ImageURL}"
+                 ${variants ? `data-srcset="${srcsetFor(variants.jpeg)}" sizes="${POSTER_SIZES}"` : ''}
+                 src="${placeholder}"
+                 alt="${escapeHtml(game.GameName)}"
+                 class="game-poster"
+                 loading="lazy"
+                 decoding="async"
+                 width="150"
+                 height="225">`;
+    if (!variants) return img;
+
+    const sources = ['avif', 'webp']
+        .filter(format => variants[format])
+        .map(format => `<source type="image/${format}" data-srcset="${srcsetFor(variants[format])}" sizes="${POSTER_SIZES}">`)
+        .join('');
+    return `<picture>${sources}${img}</picture>`;
+}
+
+function loadPoster(img) {
+    if (img.parentElement?.tagName === 'PICTURE') {
+        img.parentElement.querySelectorAll('source[data-srcset]').forEach(source => {
+            source.srcset = source.dataset.srcset;
+            source.removeAttribute('data-srcset');
+        });
+    }
+    if (img.dataset.srcset) {
+        img.srcset = img.dataset.srcset;
+        img.removeAttribute('data-srcset');
+    }
+    img.src = img.dataset.src;
+    img.removeAttribute('data-src');
+}
+
 function setupEventListeners() {
     // Add game form submission
     document.getElementById('GameName').addEventListener('keypress', function(e) {
@@ -55,6 +110,100 @@ function setupEventListeners() {
             submitGameForm();
         }
     });
+
+    // Type-ahead suggestions while typing a title
+    ['GameName', 'GameNameMobile'].forEach(id => {
+        const input = document.getElementById(id);
+        if (input) setupSuggestions(input);
+    });
+}
+
+// Type-ahead: wait this long after the last keystroke before asking the server
+const SUGGEST_DELAY = 250;
+const SUGGEST_MIN_LENGTH = 3;
+const suggestionCache = new Map();
+
+function setupSuggestions(input) {
+    const list = document.createElement('div');
+    list.className = 'suggestions';
+    input.insertAdjacentElement('afterend', list);
+
+    let timer = null;
+    let controller = null;
+
+    const hide = () => {
+        list.innerHTML = '';
+        list.style.display = 'none';
+    };
+
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        const query = input.value.trim().toLowerCase().replace(/\s+/g, ' ');
+        if (query.length < SUGGEST_MIN_LENGTH) {
+            hide();
+            return;
+        }
+        if (suggestionCache.has(query)) {
+            showSuggestions(input, list, suggestionCache.get(query));
+            return;
+        }
+        timer = setTimeout(async () => {
+            // Only the newest query matters; drop responses to older ones
+            if (controller) controller.abort();
+            controller = new AbortController();
+            try {
+                const response = await fetch(`/search_games/suggest?q=${encodeURIComponent(query)}`,
+                                             { signal: controller.signal });
+                if (!response.ok) return;
+                const data = await response.json();
+                suggestionCache.set(query, data.results);
+                if (input.value.trim().toLowerCase().replace(/\s+/g, ' ') === query) {
+                    showSuggestions(input, list, data.results);
+                }
+            } catch (error) {
+                if (error.name !== 'AbortError') console.error('Error fetching suggestions:', error);
+            }
+        }, SUGGEST_DELAY);
+    });
+
+    input.addEventListener('keydown', e => {
+        if (e.key === 'Escape' || e.key === 'Enter') {
+            clearTimeout(timer);
+            hide();
+        }
+    });
+    input.addEventListener('blur', () => setTimeout(hide, 200));
+}
+
+function showSuggestions(input, list, results) {
+    list.innerHTML = '';
+    if (!results.length) {
+        list.style.display = 'none';
+        return;
+    }
+    results.forEach(game => {
+        const item = document.createElement('div');
+        item.className = 'suggestion';
+        item.textContent = game.release_world ? `${game.game_name} (${game.release_world})` : game.game_name;
+        item.onmousedown = e => {
+            // Before the input's blur hides the list
+            e.preventDefault();
+            input.value = '';
+            list.style.display = 'none';
+            showGameSelection([{
+                id: game.game_id,
+                name: game.game_name,
+                image_url: game.game_image_url,
+                release_date: game.release_world,
+                hltb: game.main_story
+            }]);
+        };
+        list.appendChild(item);
+    });
+    list.style.left = `${input.offsetLeft}px`;
+    list.style.top = `${input.offsetTop + input.offsetHeight}px`;
+    list.style.minWidth = `${input.offsetWidth}px`;
+    list.style.display = 'block';
 }
 
 // Game Management Functions
@@ -79,6 +228,12 @@ async function submitGameForm() {
             body: JSON.stringify(payload)
         });
 
+        if (response.status === 503) {
+            const data = await response.json();
+            showNotification(data.error, 'error');
+            return;
+        }
+
         if (!response.ok) {
             const errorText = await response.text();
             console.error('Server response:', errorText);
@@ -127,15 +282,17 @@ async function updateProgressStatus(gameId, newStatus) {
         const data = await response.json();
         if (data.success) {
             showNotification('Status updated successfully!', 'success');
-            // Update local games array
+            // Update local games array and the card in place
             const game = games.find(g => g.GameID === gameId);
             if (game) {
                 game.ProgressStatus = newStatus;
+            }
+            if (isHiddenStatus(newStatus)) {
+                const gameCard = document.querySelector(`[data-game-id="${gameId}"]`);
+                if (gameCard) gameCard.remove();
+            } else {
                 updateGameCardStatus(gameId, newStatus);
             }
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000); // Wait 1 second before refreshing
         } else {
             showNotification('Failed to update status', 'error');
         }
@@ -175,17 +332,23 @@ async function deleteGame(gameId) {
 }
 
 async function getRandomGame() {
-    // Filter to only "Not Started" games, then apply any other active filters
-    const notStartedGames = filterGames().filter(game => game.ProgressStatus === 'Not Started');
-    
-    if (notStartedGames.length === 0) {
+    // The server picks among "Not Started" games matching the active filters
+    let selectedGame = null;
+    try {
+        const response = await fetch(`/random_game?${collectionQuery().toString()}`);
+        if (!response.ok) throw new Error('Network response was not ok');
+        selectedGame = (await response.json()).game;
+    } catch (error) {
+        showNotification('Error picking a random game', 'error');
+        console.error('Error:', error);
+        return;
+    }
+
+    if (!selectedGame) {
         showNotification('No unstarted games available', 'error');
         return;
     }
 
-    const randomIndex = Math.floor(Math.random() * notStartedGames.length);
-    const selectedGame = notStartedGames[randomIndex];
-    
     showNotification(`Random game selected: ${selectedGame.GameName}`, 'success');
     highlightGame(selectedGame.GameID);
 
@@ -204,12 +367,25 @@ async function updateGames() {
             method: 'POST'
         });
 
-        if (!response.ok) throw new Error('Network response was not ok');
-
         const data = await response.json();
-        if (data.success) {
-            showNotification('Games updated successfully!', 'success');
-            window.location.reload();
+        if (response.status === 409) {
+            showNotification('An update is already running', 'warning');
+        } else if (!response.ok || !data.success) {
+            throw new Error(data.message || 'Network response was not ok');
+        }
+
+        const job = await pollJob(data.job_id, job => {
+            if (job.total) {
+                showNotification(`Updating games: ${job.done}/${job.total}`, 'success');
+            }
+        });
+
+        if (job.status === 'succeeded') {
+            showNotification(job.result.message, 'success');
+            // Updated cards arrive through /events; re-query if that isn't connected
+            if (!eventsConnected()) renderGames();
+        } else if (job.status === 'cancelled') {
+            showNotification('Update cancelled', 'warning');
         } else {
             showNotification('Failed to update games', 'error');
         }
@@ -219,6 +395,20 @@ async function updateGames() {
     }
 }
 
+// Poll a background job until it finishes, reporting progress along the way
+async function pollJob(jobId, onProgress, interval = 1000) {
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}`);
+        if (!response.ok) throw new Error('Failed to fetch job status');
+
+        const job = await response.json();
+        if (!['queued', 'running'].includes(job.status)) return job;
+        if (onProgress) onProgress(job);
+
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
 // UI Helper Functions
 function showNotification(message, type) {
     const notificationBar = document.getElementById('notificationBar');
@@ -232,6 +422,14 @@ function showNotification(message, type) {
     }, 3000);
 }
 
+// Whether the active filters hide games with this status
+function isHiddenStatus(status) {
+    const statusFilter = document.getElementById('statusFilter')?.value;
+    return (statusFilter && statusFilter !== 'All' && statusFilter !== status)
+        || (status === 'Complete' && getCookie('hideCompleted') === 'true')
+        || (status === 'Tabled' && getCookie('hideTabled') === 'true');
+}
+
 function updateGameCardStatus(gameId, newStatus) {
     const gameCard = document.querySelector(`[data-game-id="${gameId}"]`);
     if (gameCard) {
@@ -246,113 +444,340 @@ function updateGameCardStatus(gameId, newStatus) {
     }
 }
 
-function highlightGame(gameId) {
-    // Find the index of the game in the full games array
-    const gameIndex = games.findIndex(g => g.GameID === gameId);
-    if (gameIndex === -1) return;
+async function highlightGame(gameId) {
+    // Load further pages until the game's card is in the grid (or we run out)
+    let gameCard = document.querySelector(`[data-game-id="${gameId}"]`);
+    while (!gameCard && nextCursor) {
+        await loadNextPage();
+        gameCard = document.querySelector(`[data-game-id="${gameId}"]`);
+    }
 
-    // Calculate how many batches we need to load to show this game
-    const requiredBatches = Math.floor(gameIndex / BATCH_SIZE) + 1;
-    
-    // Reset the current index and render enough games
-    currentIndex = 0;
-    renderGames(true, () => {
-        // After initial render, load remaining batches if needed
-        const loadRemaining = async () => {
-            while (currentIndex < requiredBatches * BATCH_SIZE) {
-                await new Promise(resolve => setTimeout(resolve, 10)); // Small delay to prevent UI freeze
-                renderGames(false);
-            }
-            
-            // Once loaded, scroll to the game and prioritize its image
-            const gameCard = document.querySelector(`[data-game-id="${gameId}"]`);
-            if (gameCard) {
-                gameCard.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                gameCard.classList.add('highlighted');
-                
-                // Immediately load the image for the highlighted game
-                const img = gameCard.querySelector('img');
-                if (img && img.dataset.src) {
-                    img.src = img.dataset.src;
-                    img.removeAttribute('data-src');
-                }
-                
-                setTimeout(() => gameCard.classList.remove('highlighted'), 2000);
-            }
-        };
-        loadRemaining();
-    });
+    if (!gameCard) {
+        showNotification('Game is hidden by the current filters', 'warning');
+        return;
+    }
+
+    gameCard.scrollIntoView({ behavior: 'smooth', block: 'center' });
+    gameCard.classList.add('highlighted');
+
+    // Immediately load the image for the highlighted game
+    const img = gameCard.querySelector('img');
+    if (img && img.dataset.src) {
+        loadPoster(img);
+    }
+
+    setTimeout(() => gameCard.classList.remove('highlighted'), 2000);
+}
+
+function createGameCard(game) {
+    const gameCard = document.createElement('div');
+    gameCard.className = `game-card status-${game.ProgressStatus.toLowerCase().replace(' ', '-')}`;
+    gameCard.dataset.gameId = game.GameID;
+
+    // Use data-src for lazy loading
+    if (selectedGames.has(game.GameID)) gameCard.classList.add('selected');
+    gameCard.innerHTML = `
+        ${!IS_VIEW_ONLY ? `<input type="checkbox" class="select-game" title="Select" onchange="toggleSelection(${game.GameID}, this.checked)" ${selectedGames.has(game.GameID) ? 'checked' : ''}>` : ''}
+        ${game.ReleaseYear ? `<div class="release-year">${game.ReleaseYear}</div>` : ''}
+        ${posterMarkup(game)}
+        <div class="game-info">
+            <div class="game-title">${escapeHtml(game.GameName)}</div>
+            <div class="game-hltb">How Long to Beat: ${game.HowLongToBeat}</div>
+            ${!IS_VIEW_ONLY ? `
+                <select onchange="updateProgressStatus(${game.GameID}, this.value)">
+                    <option value="Not Started" ${game.ProgressStatus === 'Not Started' ? 'selected' : ''}>Not Started</option>
+                    <option value="In Progress" ${game.ProgressStatus === 'In Progress' ? 'selected' : ''}>In Progress</option>
+                    <option value="Complete" ${game.ProgressStatus === 'Complete' ? 'selected' : ''}>Complete</option>
+                    <option value="Tabled" ${game.ProgressStatus === 'Tabled' ? 'selected' : ''}>Tabled</option>
+                </select>
+                <button onclick="deleteGame(${game.GameID})">Delete</button>
+            ` : `<div class="game-status">Status: ${game.ProgressStatus}</div>`}
+        </div>
+    `;
+
+    // Observe the image for lazy loading
+    const img = gameCard.querySelector('img');
+    if (img) {
+        imageObserver.observe(img);
+    }
+    return gameCard;
+}
+
+function appendGames(pageGames) {
+    const fragment = document.createDocumentFragment();
+    pageGames.forEach(game => fragment.appendChild(createGameCard(game)));
+
+    const gameGrid = document.getElementById('game-grid');
+    const sentinel = document.getElementById('sentinel');
+    if (gameGrid && sentinel) {
+        gameGrid.insertBefore(fragment, sentinel);
+    }
+}
+
+// Fetch the next page of games matching the current filters and append it
+async function loadNextPage() {
+    if (!nextCursor || pageRequest) return pageRequest;
+
+    const query = collectionQuery();
+    query.set('cursor', nextCursor);
+    const generation = filterGeneration;
+
+    pageRequest = (async () => {
+        try {
+            const response = await fetch(`/api/games?${query.toString()}`);
+            if (!response.ok) throw new Error('Failed to fetch games');
+            const page = await response.json();
+
+            // Filters changed while this page was in flight
+            if (generation !== filterGeneration) return;
+
+            games = games.concat(page.games);
+            nextCursor = page.next_cursor;
+            appendGames(page.games);
+        } catch (error) {
+            showNotification('Error loading games', 'error');
+            console.error('Error:', error);
+        } finally {
+            pageRequest = null;
+        }
+    })();
+    return pageRequest;
 }
 
-function renderGames(reset = false, callback = null) {
-    if (reset) {
+// Re-query the first page after a filter change
+async function renderGames() {
+    const generation = ++filterGeneration;
+    pageRequest = null;
+
+    try {
+        const response = await fetch(`/api/games?${collectionQuery().toString()}`);
+        if (!response.ok) throw new Error('Failed to fetch games');
+        const page = await response.json();
+        if (generation !== filterGeneration) return;
+
         const gameGrid = document.getElementById('game-grid');
-        if (!gameGrid) return;
-        
-        // Keep only the sentinel
         const sentinel = document.getElementById('sentinel');
         gameGrid.innerHTML = '';
-        if (sentinel) gameGrid.appendChild(sentinel);
-        
-        currentIndex = 0;
+        gameGrid.appendChild(sentinel);
+
+        games = page.games;
+        nextCursor = page.next_cursor;
+        appendGames(page.games);
+    } catch (error) {
+        showNotification('Error loading games', 'error');
+        console.error('Error:', error);
     }
+}
 
-    const filteredGames = filterGames();
-    const fragment = document.createDocumentFragment();
-    
-    const endIndex = Math.min(currentIndex + BATCH_SIZE, filteredGames.length);
-    
-    for (let i = currentIndex; i < endIndex; i++) {
-        const game = filteredGames[i];
-        const gameCard = document.createElement('div');
-        gameCard.className = `game-card status-${game.ProgressStatus.toLowerCase().replace(' ', '-')}`;
-        gameCard.dataset.gameId = game.GameID;
-
-        // Use data-src for lazy loading
-        gameCard.innerHTML = `
-            ${game.ReleaseYear ? `<div class="release-year">${game.ReleaseYear}</div>` : ''}
-            <img data-src="${game.ImageURL}" 
-                 src="data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 150 225'%3E%3C/svg%3E"
-                 alt="${game.GameName}" 
-                 class="game-poster"
-                 loading="lazy"
-                 decoding="async"
-                 width="150"
-                 height="225">
-            <div class="game-info">
-                <div class="game-title">${game.GameName}</div>
-                <div class="game-hltb">How Long to Beat: ${game.HowLongToBeat}</div>
-                ${!IS_VIEW_ONLY ? `
-                    <select onchange="updateProgressStatus(${game.GameID}, this.value)">
-                        <option value="Not Started" ${game.ProgressStatus === 'Not Started' ? 'selected' : ''}>Not Started</option>
-                        <option value="In Progress" ${game.ProgressStatus === 'In Progress' ? 'selected' : ''}>In Progress</option>
-                        <option value="Complete" ${game.ProgressStatus === 'Complete' ? 'selected' : ''}>Complete</option>
-                        <option value="Tabled" ${game.ProgressStatus === 'Tabled' ? 'selected' : ''}>Tabled</option>
-                    </select>
-                    <button onclick="deleteGame(${game.GameID})">Delete</button>
-                ` : ''}
-            </div>
-        `;
+// Multi-select and Batch Operations
+const selectedGames = new Set();
+let lastDeleted = [];  // Ids of the games removed by the last batch delete, kept for undo
+
+function toggleSelection(gameId, selected) {
+    if (selected) {
+        selectedGames.add(gameId);
+    } else {
+        selectedGames.delete(gameId);
+    }
+    const gameCard = document.querySelector(`[data-game-id="${gameId}"]`);
+    if (gameCard) gameCard.classList.toggle('selected', selected);
+    updateSelectionBar();
+}
+
+function updateSelectionBar() {
+    const selectionBar = document.getElementById('selectionBar');
+    if (!selectionBar) return;
+    document.getElementById('selectionCount').textContent = `${selectedGames.size} selected`;
+    document.getElementById('undoDeleteBtn').style.display = lastDeleted.length ? 'inline-block' : 'none';
+    selectionBar.classList.toggle('active', selectedGames.size > 0 || lastDeleted.length > 0);
+}
+
+function clearSelection() {
+    document.querySelectorAll('.game-card.selected').forEach(gameCard => {
+        gameCard.classList.remove('selected');
+        const checkbox = gameCard.querySelector('.select-game');
+        if (checkbox) checkbox.checked = false;
+    });
+    selectedGames.clear();
+    updateSelectionBar();
+}
+
+async function selectAllGames() {
+    // Load the remaining pages so the selection covers every matching game
+    while (nextCursor) {
+        const cursor = nextCursor;
+        await loadNextPage();
+        if (nextCursor === cursor) break;  // Page failed to load
+    }
+
+    document.querySelectorAll('#game-grid .game-card').forEach(gameCard => {
+        selectedGames.add(Number(gameCard.dataset.gameId));
+        gameCard.classList.add('selected');
+        const checkbox = gameCard.querySelector('.select-game');
+        if (checkbox) checkbox.checked = true;
+    });
+    updateSelectionBar();
+}
+
+async function runBatch(operations) {
+    const response = await fetch('/games/batch', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ operations })
+    });
+    if (!response.ok) throw new Error('Network response was not ok');
+    return response.json();
+}
+
+async function batchSetStatus() {
+    if (!selectedGames.size) return;
+    const newStatus = document.getElementById('batchStatus').value;
+
+    try {
+        const data = await runBatch([...selectedGames].map(gameId => ({
+            op: 'set_status', GameID: gameId, status: newStatus
+        })));
+
+        data.results.filter(result => result.success).forEach(result => {
+            const game = games.find(g => g.GameID === result.GameID);
+            if (game) game.ProgressStatus = newStatus;
+            if (isHiddenStatus(newStatus)) {
+                const gameCard = document.querySelector(`[data-game-id="${result.GameID}"]`);
+                if (gameCard) gameCard.remove();
+            } else {
+                updateGameCardStatus(result.GameID, newStatus);
+            }
+        });
+        showNotification(data.message, data.success ? 'success' : 'warning');
+        clearSelection();
+    } catch (error) {
+        showNotification('Error updating games', 'error');
+        console.error('Error:', error);
+    }
+}
+
+async function batchDelete() {
+    if (!selectedGames.size) return;
+    if (!confirm(`Are you sure you want to delete ${selectedGames.size} games?`)) return;
+
+    try {
+        const data = await runBatch([...selectedGames].map(gameId => ({ op: 'delete', GameID: gameId })));
+
+        const deleted = data.results.filter(result => result.success);
+        deleted.forEach(result => {
+            games = games.filter(g => g.GameID !== result.GameID);
+            selectedGames.delete(result.GameID);
+            const gameCard = document.querySelector(`[data-game-id="${result.GameID}"]`);
+            if (gameCard) gameCard.remove();
+        });
+        lastDeleted = deleted.map(result => result.GameID);
+        showNotification(data.message, data.success ? 'success' : 'warning');
+        clearSelection();
+    } catch (error) {
+        showNotification('Error deleting games', 'error');
+        console.error('Error:', error);
+    }
+}
+
+async function undoBatchDelete() {
+    if (!lastDeleted.length) return;
+
+    try {
+        const data = await runBatch(lastDeleted.map(gameId => ({ op: 'restore', GameID: gameId })));
+        lastDeleted = [];
+        showNotification(data.message, data.success ? 'success' : 'warning');
+        updateSelectionBar();
+        renderGames();  // Re-query so restored games land in sort order
+    } catch (error) {
+        showNotification('Error restoring games', 'error');
+        console.error('Error:', error);
+    }
+}
 
-        // Observe the image for lazy loading
-        const img = gameCard.querySelector('img');
-        if (img) {
-            imageObserver.observe(img);
+// Live Updates: /events publishes every change to the collection
+let eventSource = null;
+let lastEventId = 0;
+
+function connectEvents(since) {
+    lastEventId = since;
+    eventSource = new EventSource(`/events?since=${since}`);
+    eventSource.onmessage = event => {
+        lastEventId = Number(event.lastEventId) || lastEventId;
+        JSON.parse(event.data).forEach(applyChange);
+    };
+    eventSource.onerror = () => {
+        // The browser reconnects by itself unless the server refused the stream
+        if (eventSource.readyState === EventSource.CLOSED) {
+            setTimeout(() => connectEvents(lastEventId), 30000);
         }
+    };
+}
+
+function eventsConnected() {
+    return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+}
 
-        fragment.appendChild(gameCard);
+// Whether a game passes the active filters, as /api/games would decide
+function matchesFilters(game) {
+    const searchFilter = document.getElementById('searchFilter')?.value?.trim().toLowerCase();
+    return !isHiddenStatus(game.ProgressStatus)
+        && (!searchFilter || game.GameName.toLowerCase().includes(searchFilter));
+}
+
+// Grid order, mirroring the default sort in collection.py
+function compareGames(a, b) {
+    const key = game => [game.ProgressStatus === 'In Progress' ? 0 : 1, game.GameName.toLowerCase(), String(game.GameID)];
+    const [keyA, keyB] = [key(a), key(b)];
+    for (let i = 0; i < keyA.length; i++) {
+        if (keyA[i] < keyB[i]) return -1;
+        if (keyA[i] > keyB[i]) return 1;
     }
-    
-    const gameGrid = document.getElementById('game-grid');
-    const sentinel = document.getElementById('sentinel');
-    if (gameGrid && sentinel) {
-        gameGrid.insertBefore(fragment, sentinel);
+    return 0;
+}
+
+// Whether two records would render the same card
+function sameCard(a, b) {
+    return ['GameName', 'HowLongToBeat', 'ProgressStatus', 'ReleaseYear', 'ImageURL']
+        .every(field => a[field] === b[field]);
+}
+
+function insertGame(game) {
+    const index = games.findIndex(other => compareGames(game, other) < 0);
+    if (index === -1) {
+        // Past the loaded games: a later page will bring it in
+        if (nextCursor) return;
+        games.push(game);
+        appendGames([game]);
+        return;
     }
-    
-    currentIndex = endIndex;
+    const nextCard = document.querySelector(`[data-game-id="${games[index].GameID}"]`);
+    games.splice(index, 0, game);
+    if (nextCard) nextCard.before(createGameCard(game));
+}
 
-    // Call the callback if provided
-    if (callback) callback();
+// Patch the grid with one change record from /events
+function applyChange(change) {
+    if (change.type === 'reset') {
+        renderGames();
+        return;
+    }
+
+    const gameCard = document.querySelector(`[data-game-id="${change.GameID}"]`);
+    const current = games.find(g => g.GameID === change.GameID);
+    if (change.game && gameCard && current && sameCard(current, change.game)) {
+        Object.assign(current, change.game);
+        return;
+    }
+
+    games = games.filter(g => g.GameID !== change.GameID);
+    if (gameCard) gameCard.remove();
+    if (change.type === 'deleted') {
+        if (selectedGames.delete(change.GameID)) updateSelectionBar();
+    } else if (matchesFilters(change.game)) {
+        insertGame(change.game);
+    }
 }
 
 // Game Selection Popup Functions
@@ -391,7 +816,7 @@ function closeGameSelection() {
     document.getElementById('gameSelectionPopup').style.display = 'none';
 }
 
-async function selectGame(game) {
+async function selectGame(game, force = false) {
     try {
         const response = await fetch('/add_game', {
             method: 'POST',
@@ -402,13 +827,18 @@ async function selectGame(game) {
                 GameID: game.id,
                 GameName: game.name,
                 ReleaseYear: game.release_date,
-                HowLongToBeat: game.hltb
+                HowLongToBeat: game.hltb,
+                force: force
             })
         });
 
         // Check if it's a duplicate game (409 status)
         if (response.status === 409) {
-            showNotification('This game is already in your collection', 'warning');
+            const data = await response.json();
+            if (data.near_duplicates && confirm(`${data.message}\n\nAdd ${game.name} anyway?`)) {
+                return selectGame(game, true);
+            }
+            showNotification(data.near_duplicates ? 'Game not added' : 'This game is already in your collection', 'warning');
             closeGameSelection();
             return;
         }
@@ -421,11 +851,9 @@ async function selectGame(game) {
             // Clear input fields
             document.getElementById('GameName').value = '';
             document.getElementById('GameNameMobile').value = '';
-            
-            // Refresh the page after a brief delay
-            setTimeout(() => {
-                window.location.reload();
-            }, 1000);
+
+            // Show the card now; the matching /events record is a no-op
+            applyChange({ type: 'added', GameID: data.game.GameID, game: data.game });
         } else {
             showNotification('Failed to add game', 'error');
         }
@@ -438,35 +866,27 @@ async function selectGame(game) {
 }
 
 // Game Rendering and Filtering Functions
-let currentIndex = 0;
-const BATCH_SIZE = 20;
-
-function filterGames() {
-    let filteredGames = [...games];
+let games = [];           // Games loaded into the grid so far
+let nextCursor = null;    // Cursor for the next /api/games page, null when exhausted
+let pageRequest = null;   // In-flight page fetch, so scrolling doesn't double-load
+let filterGeneration = 0; // Bumped on every filter change to drop stale responses
+let searchTimer = null;
+
+// Query string for /api/games reflecting the active filters and the page's sort
+function collectionQuery() {
+    const query = new URLSearchParams();
+    const pageQuery = new URLSearchParams(window.location.search);
+    ['sort_column', 'sort_order'].forEach(name => {
+        if (pageQuery.get(name)) query.set(name, pageQuery.get(name));
+    });
     const statusFilter = document.getElementById('statusFilter')?.value;
-    const searchFilter = document.getElementById('searchFilter')?.value?.toLowerCase();
-    const hideCompleted = getCookie('hideCompleted') === 'true';
-    const hideTabled = getCookie('hideTabled') === 'true';
-
-    if (hideCompleted) {
-        filteredGames = filteredGames.filter(game => game.ProgressStatus !== 'Complete');
-    }
-
-    if (hideTabled) {
-        filteredGames = filteredGames.filter(game => game.ProgressStatus !== 'Tabled');
-    }
+    const searchFilter = document.getElementById('searchFilter')?.value?.trim();
 
-    if (statusFilter && statusFilter !== 'All') {
-        filteredGames = filteredGames.filter(game => game.ProgressStatus === statusFilter);
-    }
-
-    if (searchFilter) {
-        filteredGames = filteredGames.filter(game => 
-            game.GameName.toLowerCase().includes(searchFilter)
-        );
-    }
-
-    return filteredGames;
+    if (statusFilter && statusFilter !== 'All') query.set('status', statusFilter);
+    if (searchFilter) query.set('q', searchFilter);
+    query.set('hide_complete', getCookie('hideCompleted') === 'true');
+    query.set('hide_tabled', getCookie('hideTabled') === 'true');
+    return query;
 }
 
 function loadFilters() {
@@ -474,26 +894,17 @@ function loadFilters() {
     const searchFilter = document.getElementById('searchFilter');
 
     if (statusFilter) {
-        statusFilter.addEventListener('change', () => renderGames(true));
+        statusFilter.addEventListener('change', () => renderGames());
     }
     
     if (searchFilter) {
-        searchFilter.addEventListener('input', () => renderGames(true));
+        searchFilter.addEventListener('input', () => {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => renderGames(), 200);
+        });
     }
 }
 
-function sortGames() {
-    games.sort((a, b) => {
-        // First, compare status ("In Progress" comes first)
-        if (a.ProgressStatus === 'In Progress' && b.ProgressStatus !== 'In Progress') return -1;
-        if (b.ProgressStatus === 'In Progress' && a.ProgressStatus !== 'In Progress') return 1;
-        
-        // If both games have the same status (or neither is "In Progress"),
-        // sort alphabetically by name
-        return a.GameName.localeCompare(b.GameName);
-    });
-}
-
 function toggleMobileMenu() {
     const mobileMenu = document.querySelector('.mobile-menu');
     const overlay = document.querySelector('.menu-overlay');
@@ -535,7 +946,7 @@ function updateDisplayOptions() {
     setCookie('hideCompleted', hideCompleted, 365);
     setCookie('hideTabled', hideTabled, 365);
     
-    renderGames(); // Refresh the game display
+    renderGames(); // Re-query with the new filters
 }
 
 // Recent Games Panel Functions
@@ -560,9 +971,9 @@ function renderRecentGames(games) {
     
     recentGamesList.innerHTML = games.map(game => `
         <div class="recent-game-item" onclick="highlightGame(${game.GameID})">
-            <img src="${game.ImageURL}" alt="${game.GameName}">
+            <img src="${smallestPoster(game)}" alt="${escapeHtml(game.GameName)}">
             <div class="recent-game-info">
-                <div class="recent-game-title">${game.GameName}</div>
+                <div class="recent-game-title">${escapeHtml(game.GameName)}</div>
                 <div class="recent-game-status">${game.ProgressStatus}</div>
             </div>
         </div>
@@ -0,0 +1,792 @@
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+import weakref
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; fine for a single development server
+    fcntl = None
+
+import metrics
+from records import Game
+
+logger = logging.getLogger(__name__)
+
+STORE_SECONDS = metrics.Histogram(
+    'store_operation_seconds', 'Time spent loading and saving the collection', ('backend', 'operation'))
+
+# Collections, accounts, job and event registries and caches all default to
+# files in this directory, so mounting it is enough to keep them
+DATA_DIR = os.environ.get('DATA_DIR', '.')
+
+
+def data_path(filename):
+    """Default location of a data file: `filename` inside DATA_DIR"""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
+
+
+# JSON stores whose journals are folded into their snapshots on exit
+_json_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _compact_json_stores():
+    for store in list(_json_stores):
+        store.compact()
+
+
+def normalize_game_id(game):
+    """Coerce GameID to an int, as fix_ids.py does. Returns True if it changed."""
+    if isinstance(game['GameID'], int):
+        return False
+    game['GameID'] = int(game['GameID'])
+    return True
+
+
+class JsonGameStore:
+    """
+    Process-wide, in-memory copy of the games collection, held as Game
+    records.
+
+    The JSON file is only re-parsed when its mtime or size changes, so hand
+    edits and fix_ids.py are still picked up. Write paths update the
+    in-memory copy directly and persist it.
+
+    Single-game edits are appended to a journal next to the snapshot
+    (one JSON record per line) instead of rewriting the whole file. The
+    journal is replayed on load and folded back into the snapshot once it
+    grows past `compact_bytes`, when the store is opened and when the
+    process exits. Snapshots are written to a temp file and renamed into
+    place, so a crash never leaves a truncated file behind.
+
+    Records handed out by the read methods are shared with the store; write
+    methods replace them rather than changing them in place.
+
+    Listeners registered with subscribe() are told about every change, so
+    derived data (e.g. stats) can be maintained without rescanning.
+
+    Several processes (gunicorn workers) can share the files: writes hold an
+    exclusive flock on `path + '.lock'` and catch up with the files before
+    appending, and readers replay only the journal records other processes
+    appended since they last looked. version() is derived from the files, so
+    every process reports the same version for the same collection.
+    """
+
+    def __init__(self, path, compact_bytes=256 * 1024):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.lock_path = path + '.lock'
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+        self._games = {}
+        self._by_name_year = {}
+        self._stamp = None
+        # Bytes of the journal applied so far; only complete lines are consumed
+        self._journal_offset = 0
+        self._compacting = False
+        self._listeners = []
+        # (before, after) pairs of the write being applied, see _append()
+        self._committed = None
+        if os.path.ismount(self.path):
+            # A single bind-mounted file (docker -v games_data.json:...): the
+            # journal next to it is outside the mount and lost with the
+            # container, so fold every edit into the snapshot
+            logger.warning(f"{self.path} is mounted on its own, compacting after every write")
+            self.compact_bytes = 0
+        # Leave no journal behind from a previous run, and none at exit
+        if os.path.exists(self.journal_path):
+            self.compact()
+        _json_stores.add(self)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _file_stamp(self):
+        return (self._stat(self.path), self._stat(self.journal_path))
+
+    @contextmanager
+    def _file_lock(self, exclusive=True):
+        """
+        flock shared with other processes using the same files. Callers hold
+        self._lock; nested use is a no-op, so take the exclusive lock first
+        when a shared one would be taken inside it.
+        """
+        if fcntl is None or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        self._lock_depth = 1
+        try:
+            yield
+        finally:
+            self._lock_depth = 0
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Catch up with changes other processes (or hand edits) made to the files"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        if self._stamp is not None and stamp[0] == self._stamp[0] and stamp[1] is not None:
+            previous_journal = self._stamp[1]
+            if previous_journal is None or previous_journal[0] == stamp[1][0]:
+                # Same snapshot and journal, which only ever grows: replay the
+                # tail, unless a compaction swapped both files meanwhile
+                with STORE_SECONDS.time(backend='json', operation='replay'):
+                    self._replay_journal()
+                if self._stat(self.path) == stamp[0]:
+                    self._stamp = stamp
+                    return
+
+        # The snapshot was rewritten (compaction, replace_all, a hand edit):
+        # reload under a shared lock so we never read a half-written file
+        with self._file_lock(exclusive=False), STORE_SECONDS.time(backend='json', operation='load'):
+            stamp = self._file_stamp()
+            games = []
+            if stamp[0] is not None:
+                with open(self.path, 'r') as f:
+                    games = json.load(f)
+                logger.info(f"Loaded {len(games)} games from {self.path}")
+            self._set_games([Game.from_dict(game) for game in games])
+            self._journal_offset = 0
+            if stamp[1] is not None:
+                self._replay_journal()
+            self._stamp = stamp
+
+    def _replay_journal(self):
+        """
+        Apply journal records from self._journal_offset on. A trailing line
+        without a newline is another process mid-append (or a crash) and is
+        left for next time.
+        """
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        complete = data[:data.rfind(b'\n') + 1]
+        replayed = 0
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning(f"Ignoring corrupt journal record in {self.journal_path}")
+                continue
+            self._apply(record)
+            replayed += 1
+        self._journal_offset += len(complete)
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records from {self.journal_path}")
+
+    def _set_games(self, games):
+        self._games = {str(game.game_id): game for game in games}
+        self._by_name_year = {(game.name, game.release_year): game for game in games}
+        for listener in self._listeners:
+            listener.on_reset(list(self._games.values()))
+
+    def _notify(self, before, after):
+        for listener in self._listeners:
+            listener.on_change(before, after)
+        if self._committed is not None:
+            self._committed.append((before, after))
+
+    def _apply(self, record):
+        """
+        Apply a journal record to the in-memory collection. Records are
+        idempotent so replaying a journal that was already compacted is safe.
+        """
+        op = record['op']
+        if op == 'add':
+            game = Game.from_dict(record['game'])
+            previous = self._remove(str(game.game_id))
+            self._put(game)
+            self._notify(previous, game)
+            return game
+        if op == 'update':
+            before = self._games.get(str(record['id']))
+            if before is None:
+                return None
+            game = before.replace(record['fields'])
+            if (before.name, before.release_year) != (game.name, game.release_year):
+                self._by_name_year.pop((before.name, before.release_year), None)
+            self._put(game)
+            self._notify(before, game)
+            return game
+        if op == 'delete':
+            game = self._remove(str(record['id']))
+            if game is not None:
+                self._notify(game, None)
+            return game
+        if op == 'batch':
+            return [self._apply(sub_record) for sub_record in record['records']]
+        raise ValueError(f"Unknown journal op: {op}")
+
+    def _put(self, game):
+        self._games[str(game.game_id)] = game
+        self._by_name_year[(game.name, game.release_year)] = game
+
+    def _remove(self, key):
+        game = self._games.pop(key, None)
+        if game is not None:
+            self._by_name_year.pop((game.name, game.release_year), None)
+        return game
+
+    def _append(self, record):
+        """
+        Append a record to the journal, then apply it in memory. Callers
+        hold the exclusive file lock and have just refreshed, so everything
+        before self._journal_offset is already applied.
+        """
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with open(self.journal_path, 'ab') as f, STORE_SECONDS.time(backend='json', operation='append'):
+            if f.tell() > self._journal_offset:
+                # A writer died mid-append; end its partial line so it is
+                # skipped rather than swallowing this record
+                line = b'\n' + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_offset = f.tell()
+        self._committed = []
+        try:
+            result = self._apply(record)
+        finally:
+            changes, self._committed = self._committed, None
+        _notify_commit(self._listeners, changes)
+        self._stamp = self._file_stamp()
+        if self._stamp[1] and self._stamp[1][2] >= self.compact_bytes:
+            self._compact_in_background()
+        return result
+
+    def _write_snapshot(self):
+        """Atomically replace the snapshot with the in-memory collection and drop the journal"""
+        with STORE_SECONDS.time(backend='json', operation='snapshot'):
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump([game.to_dict() for game in self._games.values()], f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                # A single bind-mounted file (docker -v games_data.json:...) can't be
+                # renamed over; fall back to rewriting it in place, and fold every
+                # edit into it from now on as the journal is outside the mount
+                logger.warning(f"Atomic rename of {self.path} failed ({e}), rewriting in place "
+                               f"and compacting after every write")
+                with open(temp_path, 'r') as src, open(self.path, 'w') as dst:
+                    dst.write(src.read())
+                os.remove(temp_path)
+                self.compact_bytes = 0
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_offset = 0
+        self._stamp = self._file_stamp()
+
+    def _compact_in_background(self):
+        if self._compacting:
+            return
+        self._compacting = True
+        threading.Thread(target=self.compact, name='journal-compaction', daemon=True).start()
+
+    def compact(self):
+        """Fold the journal into the snapshot"""
+        try:
+            with self._lock, self._file_lock():
+                self._refresh()
+                if self._stamp[1] is not None:
+                    self._write_snapshot()
+                    logger.info(f"Compacted journal into {self.path}")
+        except Exception as e:
+            logger.error(f"Error compacting journal: {str(e)}")
+        finally:
+            self._compacting = False
+
+    def refresh(self):
+        """Pick up changes made to the files by other processes or by hand"""
+        with self._lock:
+            self._refresh()
+
+    def version(self):
+        """
+        Opaque string that changes whenever the collection does: the
+        snapshot's identity plus how much of the journal has been applied
+        """
+        with self._lock:
+            self._refresh()
+            snapshot = self._stamp[0] or (0, 0, 0)
+            return f'{snapshot[0]:x}.{snapshot[1]:x}.{self._journal_offset:x}'
+
+    def subscribe(self, listener):
+        """
+        Register a listener with on_reset(games) and on_change(before, after)
+        methods. It is reset with the current collection straight away.
+
+        Listeners may also have an on_commit(changes) method, called once per
+        write made by this process (not ones replayed from other processes)
+        with its (before, after) pairs.
+        """
+        with self._lock:
+            self._refresh()
+            self._listeners.append(listener)
+            listener.on_reset(list(self._games.values()))
+
+    # Read paths
+
+    def all(self):
+        """Return a new list of all games"""
+        with self._lock:
+            self._refresh()
+            return list(self._games.values())
+
+    def get(self, game_id):
+        with self._lock:
+            self._refresh()
+            return self._games.get(str(game_id))
+
+    def find(self, game_name, release_year):
+        """Return the game matching a name and release year, if any"""
+        with self._lock:
+            self._refresh()
+            return self._by_name_year.get((game_name, release_year))
+
+    def by_status(self, status):
+        with self._lock:
+            self._refresh()
+            return [game for game in self._games.values() if game.status == status]
+
+    def recent(self, limit):
+        """Most recently added games (entries without DateAdded sort last)"""
+        with self._lock:
+            self._refresh()
+            return sorted(self._games.values(), key=lambda game: game.added_key, reverse=True)[:limit]
+
+    # Write paths
+
+    def add(self, game):
+        with self._lock, self._file_lock():
+            self._refresh()
+            self._append({'op': 'add', 'game': game.to_dict()})
+
+    def add_many(self, games):
+        """Add several games as a single journal record"""
+        with self._lock, self._file_lock():
+            self._refresh()
+            records = [{'op': 'add', 'game': game.to_dict()} for game in games]
+            if records:
+                self._append({'op': 'batch', 'records': records})
+
+    def update(self, game_id, **fields):
+        """Update fields of a single game. Returns False if it doesn't exist."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            if str(game_id) not in self._games:
+                return False
+            self._append({'op': 'update', 'id': game_id, 'fields': fields})
+            return True
+
+    def update_many(self, changes):
+        """
+        Apply {game_id: fields} for several games as a single journal record.
+        Unknown ids are skipped. Returns the number of games updated.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            records = [{'op': 'update', 'id': game_id, 'fields': fields}
+                       for game_id, fields in changes.items()
+                       if fields and str(game_id) in self._games]
+            if records:
+                self._append({'op': 'batch', 'records': records})
+            return len(records)
+
+    def apply_batch(self, operations):
+        """
+        Apply a list of ('update', game_id, fields), ('delete', game_id) and
+        ('add', game) operations, in order, as a single journal record.
+        Updates and deletes of missing games and adds of existing ones are
+        skipped. Returns a list of booleans saying which operations applied.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            present = set(self._games)
+            records = []
+            applied = []
+            for operation in operations:
+                op = operation[0]
+                if op == 'add':
+                    key = str(operation[1].game_id)
+                    ok = key not in present
+                    record = {'op': 'add', 'game': operation[1].to_dict()}
+                    present.add(key)
+                else:
+                    key = str(operation[1])
+                    ok = key in present
+                    if op == 'update':
+                        record = {'op': 'update', 'id': operation[1], 'fields': operation[2]}
+                    else:
+                        record = {'op': 'delete', 'id': operation[1]}
+                        present.discard(key)
+                applied.append(ok)
+                if ok:
+                    records.append(record)
+            if records:
+                self._append({'op': 'batch', 'records': records})
+            return applied
+
+    def delete(self, game_id):
+        """Remove a game. Returns False if it doesn't exist."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            if str(game_id) not in self._games:
+                return False
+            self._append({'op': 'delete', 'id': game_id})
+            return True
+
+    def replace_all(self, games):
+        """Replace the whole collection, e.g. after a bulk refresh"""
+        with self._lock, self._file_lock():
+            self._set_games(list(games))
+            self._write_snapshot()
+
+
+def _notify_commit(listeners, changes):
+    """Tell listeners that have an on_commit method about a local write"""
+    if not changes:
+        return
+    for listener in listeners:
+        on_commit = getattr(listener, 'on_commit', None)
+        if on_commit is not None:
+            on_commit(changes)
+
+
+# Columns stored natively in SQLite; any other fields go into the Extra JSON blob
+SQLITE_COLUMNS = ('GameID', 'GameName', 'HowLongToBeat', 'ProgressStatus',
+                  'ImageURL', 'ReleaseYear', 'DateAdded')
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    GameID INTEGER PRIMARY KEY,
+    GameName TEXT NOT NULL,
+    HowLongToBeat,
+    ProgressStatus TEXT NOT NULL,
+    ImageURL TEXT,
+    ReleaseYear INTEGER,
+    DateAdded TEXT,
+    Extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_games_status ON games (ProgressStatus);
+CREATE INDEX IF NOT EXISTS idx_games_date_added ON games (DateAdded);
+CREATE INDEX IF NOT EXISTS idx_games_name_year ON games (GameName, ReleaseYear);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+
+class SqliteGameStore:
+    """
+    SQLite-backed games collection with the same interface as JsonGameStore.
+
+    GameID is the primary key and ProgressStatus, DateAdded and
+    (GameName, ReleaseYear) are indexed, so point lookups, duplicate checks
+    and status-filtered queries don't scan the whole collection.
+
+    Writes run in IMMEDIATE transactions, so writers in other processes
+    queue up instead of overwriting each other's read-modify-writes. Each
+    one bumps a counter in the meta table that version() reports, and
+    listeners are reset when PRAGMA data_version shows another connection
+    has committed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._listeners = []
+        # Transactions are managed explicitly, see _transaction()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._conn.execute("INSERT OR IGNORE INTO meta VALUES ('epoch', ?), ('version', 0)",
+                           (uuid.uuid4().hex[:8],))
+        self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _sync(self):
+        """Reset listeners if another process committed since we last looked"""
+        data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        if self._listeners:
+            with STORE_SECONDS.time(backend='sqlite', operation='load'):
+                games = [self._row_to_game(row) for row in self._conn.execute('SELECT * FROM games')]
+            for listener in self._listeners:
+                listener.on_reset(games)
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction that also bumps the shared version"""
+        self._sync()
+        with STORE_SECONDS.time(backend='sqlite', operation='write'):
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield
+                self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        with STORE_SECONDS.time(backend='sqlite', operation='query'):
+            with self._lock:
+                self._sync()
+                rows = self._conn.execute(sql, params).fetchall()
+            return [self._row_to_game(row) for row in rows]
+
+    @staticmethod
+    def _row_to_game(row):
+        game = {column: row[column] for column in SQLITE_COLUMNS}
+        if row['Extra']:
+            game.update(json.loads(row['Extra']))
+        return Game.from_dict(game)
+
+    @staticmethod
+    def _game_to_row(game):
+        record = game.to_dict()
+        extra = {k: v for k, v in record.items() if k not in SQLITE_COLUMNS}
+        return tuple(record.get(column) for column in SQLITE_COLUMNS) + (
+            json.dumps(extra) if extra else None,
+        )
+
+    def _insert(self, games):
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [self._game_to_row(game) for game in games]
+        )
+
+    def _get(self, game_id):
+        games = self._query('SELECT * FROM games WHERE GameID = ?', (game_id,))
+        return games[0] if games else None
+
+    def _notify(self, changes):
+        for listener in self._listeners:
+            for before, after in changes:
+                listener.on_change(before, after)
+        _notify_commit(self._listeners, changes)
+
+    def refresh(self):
+        """Reads go straight to the database; this only catches listeners up"""
+        with self._lock:
+            self._sync()
+
+    def version(self):
+        """Opaque string that changes whenever the collection does"""
+        with self._lock:
+            self._sync()
+            meta = dict(self._conn.execute("SELECT key, value FROM meta WHERE key IN ('epoch', 'version')"))
+            return f"{meta['epoch']}.{meta['version']}"
+
+    def subscribe(self, listener):
+        """Register a change listener, see JsonGameStore.subscribe"""
+        with self._lock:
+            self._listeners.append(listener)
+            listener.on_reset(self.all())
+
+    # Read paths
+
+    def all(self):
+        return self._query('SELECT * FROM games')
+
+    def get(self, game_id):
+        try:
+            game_id = int(game_id)
+        except (ValueError, TypeError):
+            return None
+        return self._get(game_id)
+
+    def find(self, game_name, release_year):
+        games = self._query(
+            'SELECT * FROM games WHERE GameName = ? AND ReleaseYear IS ? LIMIT 1',
+            (game_name, release_year)
+        )
+        return games[0] if games else None
+
+    def by_status(self, status):
+        return self._query('SELECT * FROM games WHERE ProgressStatus = ?', (status,))
+
+    def recent(self, limit):
+        return self._query(
+            "SELECT * FROM games ORDER BY COALESCE(DateAdded, '') DESC LIMIT ?", (limit,)
+        )
+
+    # Write paths
+
+    def add(self, game):
+        with self._lock:
+            with self._transaction():
+                previous = self._get(game.game_id)
+                self._insert([game])
+            self._notify([(previous, game)])
+
+    def add_many(self, games):
+        """Add several games in one transaction"""
+        with self._lock:
+            with self._transaction():
+                changes = [(self._get(game.game_id), game) for game in games]
+                self._insert(games)
+            self._notify(changes)
+
+    def _update(self, game_id, fields):
+        """
+        Update a row inside the caller's transaction. Returns the
+        (before, after) records, or None if the game doesn't exist.
+        """
+        try:
+            game_id = int(game_id)
+        except (ValueError, TypeError):
+            return None
+        before = self._get(game_id)
+        if before is None:
+            return None
+        game = before.replace(fields)
+        self._insert([game])
+        return before, game
+
+    def update(self, game_id, **fields):
+        with self._lock:
+            with self._transaction():
+                change = self._update(game_id, fields)
+            if change is None:
+                return False
+            self._notify([change])
+            return True
+
+    def update_many(self, changes):
+        """Apply {game_id: fields} for several games in one transaction"""
+        with self._lock:
+            with self._transaction():
+                applied = [self._update(game_id, fields) for game_id, fields in changes.items() if fields]
+            applied = [change for change in applied if change is not None]
+            self._notify(applied)
+            return len(applied)
+
+    def apply_batch(self, operations):
+        """Apply a list of operations in one transaction, see JsonGameStore.apply_batch"""
+        changes = []
+        applied = []
+        with self._lock:
+            with self._transaction():
+                for operation in operations:
+                    op = operation[0]
+                    if op == 'add':
+                        game = operation[1]
+                        ok = self._get(game.game_id) is None
+                        if ok:
+                            self._insert([game])
+                            changes.append((None, game))
+                    elif op == 'update':
+                        change = self._update(operation[1], operation[2])
+                        ok = change is not None
+                        if ok:
+                            changes.append(change)
+                    else:
+                        before = self.get(operation[1])
+                        ok = before is not None
+                        if ok:
+                            self._conn.execute('DELETE FROM games WHERE GameID = ?', (before.game_id,))
+                            changes.append((before, None))
+                    applied.append(ok)
+            self._notify(changes)
+        return applied
+
+    def delete(self, game_id):
+        try:
+            game_id = int(game_id)
+        except (ValueError, TypeError):
+            return False
+        with self._lock:
+            with self._transaction():
+                before = self._get(game_id)
+                self._conn.execute('DELETE FROM games WHERE GameID = ?', (game_id,))
+            if before is None:
+                return False
+            self._notify([(before, None)])
+            return True
+
+    def replace_all(self, games):
+        games = list(games)
+        with self._lock:
+            with self._transaction():
+                self._conn.execute('DELETE FROM games')
+                self._insert(games)
+            for listener in self._listeners:
+                listener.on_reset(games)
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM games LIMIT 1').fetchone() is None
+
+
+def migrate_json_to_sqlite(json_path, db_store):
+    """
+    Import games from a JSON snapshot into a SqliteGameStore, normalizing
+    GameIDs to integers along the way. Returns the number of games imported.
+    """
+    with open(json_path, 'r') as f:
+        games = json.load(f)
+
+    imported = []
+    for game in games:
+        try:
+            normalize_game_id(game)
+        except (ValueError, TypeError):
+            logger.warning(f"Skipping game with non-integer GameID: {game.get('GameName')}")
+            continue
+        imported.append(game)
+
+    db_store.replace_all([Game.from_dict(game) for game in imported])
+    logger.info(f"Migrated {len(imported)} games from {json_path} to {db_store.path}")
+    return len(imported)
+
+
+def open_store(json_path=None, db_path=None):
+    """
+    Build the configured store. STORAGE_BACKEND selects 'json' (default) or
+    'sqlite'; an empty SQLite database is seeded from the JSON file on first
+    use. The paths default to GAMES_DATA and GAMES_DB, or files in DATA_DIR.
+    """
+    json_path = json_path or os.environ.get('GAMES_DATA') or data_path('games_data.json')
+    backend = os.environ.get('STORAGE_BACKEND', 'json').lower()
+
+    if backend == 'sqlite':
+        db_store = SqliteGameStore(db_path or os.environ.get('GAMES_DB') or data_path('games_data.db'))
+        if db_store.is_empty() and os.path.exists(json_path):
+            migrate_json_to_sqlite(json_path, db_store)
+        return db_store
+    if backend != 'json':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+    return JsonGameStore(json_path)
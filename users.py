@@ -0,0 +1,241 @@
+import hmac
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import images
+from aggregates import CollectionStats
+from events import DeletedGames, EventLog
+from jobs import JobManager
+from name_index import NameIndex
+from store import data_path, open_store
+
+logger = logging.getLogger(__name__)
+
+USERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    public INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Usernames double as directory names under USERS_DIR
+USERNAME = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+
+
+class InvalidUser(ValueError):
+    """Raised for a username that is malformed, taken or unknown"""
+
+
+class UserRegistry:
+    """
+    Accounts, in an SQLite database shared by all worker processes. The
+    admin account always exists and its password is ADMIN_PASSWORD rather
+    than a stored hash, so single-user installs keep working unchanged.
+
+    Collections are private unless their user makes them public; only
+    public ones (and the admin's, as before) can be opened view-only.
+    """
+
+    def __init__(self, path, admin, admin_password):
+        self.admin = admin
+        self._admin_password = admin_password
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.executescript(USERS_SCHEMA)
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(users)')}
+        if 'public' not in columns:
+            self._db.execute('ALTER TABLE users ADD COLUMN public INTEGER NOT NULL DEFAULT 0')
+        self._names = None
+        self._data_version = None
+
+    def _usernames(self):
+        """
+        {username: public} of registered users, re-read only after the
+        database changed. Callers hold _lock.
+        """
+        # data_version changes whenever another connection commits
+        data_version = self._db.execute('PRAGMA data_version').fetchone()[0]
+        if self._names is None or data_version != self._data_version:
+            self._names = {name: bool(public) for name, public in self._db.execute('SELECT name, public FROM users')}
+            self._data_version = data_version
+        return self._names
+
+    def names(self):
+        """Every username, the admin first"""
+        with self._lock:
+            names = sorted(self._usernames())
+        return [self.admin] + [name for name in names if name != self.admin]
+
+    def exists(self, name):
+        if name == self.admin:
+            return True
+        with self._lock:
+            return name in self._usernames()
+
+    def is_public(self, name):
+        """Whether anyone may view the user's collection without logging in"""
+        if name == self.admin:
+            return True
+        with self._lock:
+            return self._usernames().get(name, False)
+
+    def set_public(self, name, public):
+        if name == self.admin:
+            raise InvalidUser("The admin's collection is always viewable")
+        with self._lock:
+            self._db.execute('UPDATE users SET public = ? WHERE name = ?', (int(bool(public)), name))
+            self._names = None
+
+    def check(self, name, password):
+        """Whether `password` is the user's password"""
+        if name == self.admin:
+            return hmac.compare_digest(password.encode(), self._admin_password.encode())
+        with self._lock:
+            row = self._db.execute('SELECT password_hash FROM users WHERE name = ?', (name,)).fetchone()
+        return row is not None and check_password_hash(row[0], password)
+
+    def add(self, name, password, public=False):
+        if not USERNAME.match(name or ''):
+            raise InvalidUser('Usernames are 1-32 lowercase letters, digits, - or _')
+        if not password:
+            raise InvalidUser('A password is required')
+        if name == self.admin:
+            raise InvalidUser(f'{name} already exists')
+        try:
+            with self._lock:
+                self._db.execute('INSERT INTO users VALUES (?, ?, ?, ?)',
+                                 (name, generate_password_hash(password), time.time(), int(bool(public))))
+                self._names = None
+        except sqlite3.IntegrityError:
+            raise InvalidUser(f'{name} already exists')
+        logger.info(f"Added user {name}")
+
+    def remove(self, name):
+        """Delete an account. Its collection files are left on disk."""
+        if name == self.admin:
+            raise InvalidUser('The admin account cannot be removed')
+        with self._lock:
+            deleted = self._db.execute('DELETE FROM users WHERE name = ?', (name,)).rowcount
+            self._names = None
+        if not deleted:
+            raise InvalidUser(f'No user named {name}')
+        logger.info(f"Removed user {name}")
+
+
+class UserCollection:
+    """
+    One user's collection: the store and everything kept up to date from
+    it, plus the user's job registry. Each user's data lives in separate
+    files; the HLTB cache and the poster cache are shared.
+    """
+
+    def __init__(self, name, json_path, db_path, jobs_path, events_path):
+        self.name = name
+        self.store = open_store(json_path, db_path)
+
+        # Stats aggregates, updated by the store on every change
+        self.stats = CollectionStats()
+        self.store.subscribe(self.stats)
+
+        # Trigram index over game names for fuzzy search and duplicate warnings
+        self.name_index = NameIndex()
+        self.store.subscribe(self.name_index)
+
+        # Change feed behind /events. Like the job registry it is shared by
+        # all worker processes, so every open tab hears about every edit
+        self.events = EventLog(path=events_path)
+        self.store.subscribe(self.events)
+
+        # Deleted records, kept next to the change feed so deletes can be undone
+        self.deleted = DeletedGames(path=events_path)
+        self.store.subscribe(self.deleted)
+
+        # Which games this user has, so shared posters outlive nobody's games
+        self.store.subscribe(images.PosterRefs(name))
+
+        # Background runner for long operations (updates, image refetches).
+        # The registry is shared by all worker processes, so any of them can
+        # report on a job
+        self.jobs = JobManager(path=jobs_path)
+
+
+class UserCollections:
+    """
+    Collections by username, opened on first use. The admin's collection
+    keeps the single-user file locations (GAMES_DATA, GAMES_DB, JOBS_DB and
+    EVENTS_DB, by default in DATA_DIR); everyone else's live in their own
+    directory under `root`. Removing a user moves their directory aside, so
+    a new account with the same name starts empty.
+    """
+
+    def __init__(self, root, admin):
+        self.root = root
+        self.admin = admin
+        self._lock = threading.Lock()
+        # name -> (UserCollection, identity of its directory when opened)
+        self._collections = {}
+
+    def _directory_id(self, name):
+        """Identity of a user's directory, so a recreated one isn't mistaken for the old"""
+        if name == self.admin:
+            return None
+        try:
+            stat = os.stat(os.path.join(self.root, name))
+        except FileNotFoundError:
+            return None
+        return (stat.st_dev, stat.st_ino)
+
+    def paths(self, name):
+        """(json, sqlite, jobs, events) file paths of a user's collection"""
+        if name == self.admin:
+            return (os.environ.get('GAMES_DATA') or data_path('games_data.json'),
+                    os.environ.get('GAMES_DB') or data_path('games_data.db'),
+                    os.environ.get('JOBS_DB') or data_path('jobs.db'),
+                    os.environ.get('EVENTS_DB') or data_path('events.db'))
+        if not USERNAME.match(name):
+            raise InvalidUser(f'Invalid username {name!r}')
+        directory = os.path.join(self.root, name)
+        os.makedirs(directory, exist_ok=True)
+        return tuple(os.path.join(directory, filename)
+                     for filename in ('games_data.json', 'games_data.db', 'jobs.db', 'events.db'))
+
+    def get(self, name):
+        with self._lock:
+            user_collection, directory_id = self._collections.get(name, (None, None))
+            # Another process may have removed the user and the name been reused
+            if user_collection is None or directory_id != self._directory_id(name):
+                user_collection = UserCollection(name, *self.paths(name))
+                self._collections[name] = (user_collection, self._directory_id(name))
+            return user_collection
+
+    def loaded(self, name):
+        """The user's collection if this process has it open, else None"""
+        with self._lock:
+            return self._collections.get(name, (None, None))[0]
+
+    def open_once(self, name):
+        """A fresh copy of the user's collection that this process doesn't keep"""
+        return UserCollection(name, *self.paths(name))
+
+    def unload(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def remove(self, name):
+        """
+        Close a removed user's collection and move their directory aside to
+        `.removed-<name>-<time>` (never a valid username), keeping the files
+        without handing them to a later account of the same name
+        """
+        self.unload(name)
+        directory = os.path.join(self.root, name)
+        if os.path.isdir(directory):
+            os.rename(directory, os.path.join(self.root, f'.removed-{name}-{int(time.time())}'))